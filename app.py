@@ -1,174 +1,971 @@
+import io
 import os
 import json
-import math
-import tempfile
 import uuid
-import base64
+import hashlib
+import sqlite3
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import fitz  # PyMuPDF
-from flask import Flask, request, send_file, render_template_string, jsonify
+from flask import Flask, Response, g, request, send_file, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import FormDataParser
+
+from engine import (DATA_DIR, DOC_POOL, TILE_CACHE, DiskCache, SheetIndex, impose, plan_layout,
+                    render_preview, sha256_file)
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 200 * 1024 * 1024  # 200MB limit
 
-# Store temp paths in a global dict for this session (simple local storage)
-FILE_STORAGE = {} 
+# Uploads, outputs and jobs are stored under DATA_DIR (PYNUP_DATA_DIR) and
+# tracked in SQLite there, so every server worker sees them
+FILE_TTL = int(os.environ.get('PYNUP_FILE_TTL', 6 * 3600))  # seconds since last use
+STORAGE_QUOTA = int(os.environ.get('PYNUP_STORAGE_QUOTA_MB', 2048)) * 1024 * 1024
+SWEEP_INTERVAL = int(os.environ.get('PYNUP_SWEEP_INTERVAL', 300))
+ACCESS_RESOLUTION = 60  # seconds; last-use times are refreshed at most this often
+
+# Uploads are streamed to disk in chunks; resumable uploads may exceed MAX_CONTENT_LENGTH
+UPLOAD_CHUNK = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.environ.get('PYNUP_MAX_UPLOAD_MB', 2048)) * 1024 * 1024
+# Open resumable upload sessions; ones idle longer than UPLOAD_IDLE_TTL make room
+MAX_UPLOAD_SESSIONS = int(os.environ.get('PYNUP_MAX_UPLOAD_SESSIONS', 64))
+UPLOAD_IDLE_TTL = int(os.environ.get('PYNUP_UPLOAD_IDLE_TTL', 3600))
+
+# Background /jobs: how many run at once and how many may wait behind them.
+# JOB_WORKERS is per server process (n gunicorn workers run up to n * JOB_WORKERS
+# jobs); the queued + running cap of JOB_WORKERS + JOB_QUEUE_LIMIT is enforced
+# through the registry across all of them.
+JOB_WORKERS = int(os.environ.get('PYNUP_JOB_WORKERS', 2))
+JOB_QUEUE_LIMIT = int(os.environ.get('PYNUP_JOB_QUEUE_LIMIT', 8))
+JOB_RETENTION = 3600  # seconds a finished job stays visible
+# Processes refresh their unfinished jobs' heartbeat this often (seconds). A job
+# silent for JOB_STALE_AFTER is failed once its owner process has exited; a live
+# owner may only be stuck in a long PyMuPDF call holding the GIL, and is given
+# JOB_HUNG_FACTOR times as long (its pid may also belong to a new process by now)
+JOB_HEARTBEAT = 10
+JOB_STALE_AFTER = int(os.environ.get('PYNUP_JOB_STALE_AFTER', 60))
+JOB_HUNG_FACTOR = 10
+
+# Page thumbnails for the selector grid
+THUMB_CACHE_BYTES = int(os.environ.get('PYNUP_THUMB_CACHE_MB', 128)) * 1024 * 1024
+THUMB_SCALE = 0.2
+# Low-resolution sheet previews, rendered on demand
+PREVIEW_CACHE_BYTES = int(os.environ.get('PYNUP_PREVIEW_CACHE_MB', 64)) * 1024 * 1024
+PREVIEW_DPI = int(os.environ.get('PYNUP_PREVIEW_DPI', 48))
+
+THUMB_CACHE = DiskCache('thumbs', THUMB_CACHE_BYTES)
+PREVIEW_CACHE = DiskCache('previews', PREVIEW_CACHE_BYTES)
+
+# --- METRICS ---
+# Minimal Prometheus text-format metrics. Each server process counts in memory
+# and publishes its totals to the registry every METRICS_PUBLISH seconds;
+# /metrics adds up all processes, so any worker can answer a scrape.
+METRICS_PUBLISH = int(os.environ.get('PYNUP_METRICS_PUBLISH', 5))
+
+class _Metric:
+    TYPE = None
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = {}
+        self._lock = threading.Lock()
+        METRICS.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(l, '')) for l in self.labels)
+
+    def snapshot(self):
+        with self._lock: return dict(self.values)
+
+    def render(self, values):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.TYPE}"]
+
+class Counter(_Metric):
+    TYPE = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock: self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self, values):
+        lines = super().render(values)
+        for key, value in values.items():
+            lines.append(f"{self.name}{_label_str(dict(zip(self.labels, key)))} {value}")
+        return lines
+
+class Histogram(_Metric):
+    TYPE = 'histogram'
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self.values.get(key) or ([0] * len(self.BUCKETS), 0.0, 0)
+            counts = [c + (value <= b) for c, b in zip(counts, self.BUCKETS)]
+            self.values[key] = (counts, total + value, n + 1)
+
+    def render(self, values):
+        lines = super().render(values)
+        for key, (counts, total, n) in values.items():
+            labels = dict(zip(self.labels, key))
+            for bound, count in zip(self.BUCKETS, counts):
+                lines.append(f"{self.name}_bucket{_label_str({**labels, 'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{_label_str({**labels, 'le': '+Inf'})} {n}")
+            lines.append(f"{self.name}_sum{_label_str(labels)} {total}")
+            lines.append(f"{self.name}_count{_label_str(labels)} {n}")
+        return lines
+
+def _label_str(labels):
+    if not labels: return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in labels.items()) + '}'
+
+METRICS = []
+REQUEST_SECONDS = Histogram('pynup_request_seconds', 'HTTP request latency.', ('endpoint', 'status'))
+STAGE_SECONDS = Histogram('pynup_stage_seconds', 'Time spent per processing stage.', ('op', 'stage'))
+JOB_SECONDS = Histogram('pynup_job_seconds', 'End-to-end imposition time.', ('mode',))
+PAGES_TOTAL = Counter('pynup_pages_total', 'Pages placed on output sheets.', ('path',))
+SHEETS_TOTAL = Counter('pynup_sheets_total', 'Output sheets produced.')
+BYTES_TOTAL = Counter('pynup_bytes_total', 'Bytes uploaded, read by imposition and written to outputs.', ('direction',))
+TILES_TOTAL = Counter('pynup_raster_tiles_total', 'Raster tiles placed, by encoding.', ('format',))
+BYTES_SAVED = Counter('pynup_output_bytes_saved_total',
+                      'Bytes removed by output optimization, for runs with measure_savings.', ('profile',))
+JOBS_TOTAL = Counter('pynup_jobs_total', 'Imposition runs by result.', ('mode', 'result'))
+
+CACHES = {'tiles': TILE_CACHE, 'thumbnails': THUMB_CACHE, 'previews': PREVIEW_CACHE}
+
+def _add(a, b):
+    # Counter values add up; histogram values are [bucket counts, sum, count]
+    if a is None: return b
+    if isinstance(a, list): return [_add(x, y) for x, y in zip(a, b)]
+    return a + b
+
+def _local_series():
+    """{(metric name, JSON label values): JSON value} counted by this process."""
+    series = {(m.name, json.dumps(key)): json.dumps(value)
+              for m in METRICS for key, value in m.snapshot().items()}
+    for name, cache in CACHES.items():
+        st = cache.stats()
+        for field in ('hits', 'misses'):
+            series[(f"pynup_cache_{field}_total", json.dumps([name]))] = json.dumps(st[field])
+    return series
+
+# Rows are keyed by pid plus a random suffix, since a new worker may reuse a dead one's pid
+_published = {'pid': None, 'process': None, 'series': {}}
+_publish_lock = threading.Lock()
+
+def publish_metrics():
+    """Write this process's changed totals to the registry."""
+    with _publish_lock:
+        if _published['pid'] != os.getpid():
+            _published.update(pid=os.getpid(), process=f"{os.getpid()}-{uuid.uuid4().hex[:8]}", series={})
+        series = _local_series()
+        changed = [(name, labels, value) for (name, labels), value in series.items()
+                   if _published['series'].get((name, labels)) != value]
+        if changed: FILES.publish_metrics(_published['process'], _published['pid'], changed)
+        _published['series'] = series
+
+def metric_totals():
+    """{metric name: {label values: value}} summed over every server process."""
+    publish_metrics()
+    totals = {}
+    for row in FILES.metric_rows():
+        values = totals.setdefault(row['name'], {})
+        key = tuple(json.loads(row['labels']))
+        values[key] = _add(values.get(key), json.loads(row['value']))
+    return totals
+
+def record_impose_stats(stats, mode):
+    for stage, seconds in stats.get('stages', {}).items():
+        STAGE_SECONDS.observe(seconds, op='process', stage=stage)
+    if 'wall' in stats: JOB_SECONDS.observe(stats['wall'], mode=mode)
+    PAGES_TOTAL.inc(stats.get('vector_pages', 0), path='vector')
+    PAGES_TOTAL.inc(stats.get('raster_pages', 0), path='raster')
+    SHEETS_TOTAL.inc(stats.get('sheets', 0))
+    for fmt, count in stats.get('tile_formats', {}).items(): TILES_TOTAL.inc(count, format=fmt)
+    BYTES_TOTAL.inc(stats.get('bytes_in', 0), direction='in')
+    BYTES_TOTAL.inc(stats.get('bytes_out', 0), direction='out')
+    output = stats.get('output') or {}
+    if output.get('bytes_saved') is not None: BYTES_SAVED.inc(output['bytes_saved'], profile=output['profile'])
+
+def server_timing(stats):
+    """Format impose() stage timings as a Server-Timing header value."""
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in stats.get('stages', {}).items())
+
+
+# --- FILE REGISTRY ---
+def pid_alive(pid):
+    """Whether process pid is running; registry rows come from processes on this host."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # alive, but owned by another user
+    return True
+
+class FileRegistry:
+    """Uploaded inputs, produced outputs and job records in a shared SQLite file."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            id TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL,
+            pages INTEGER NOT NULL, sha256 TEXT NOT NULL,
+            created REAL NOT NULL, accessed REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL,
+            pages INTEGER NOT NULL, created REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS outputs (
+            path TEXT PRIMARY KEY, size INTEGER NOT NULL, created REAL NOT NULL);
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT NOT NULL,
+            done INTEGER NOT NULL, total INTEGER NOT NULL, error TEXT,
+            created REAL NOT NULL, started REAL, finished REAL, output_path TEXT NOT NULL,
+            timings TEXT, owner INTEGER, heartbeat REAL);
+        CREATE TABLE IF NOT EXISTS metrics (
+            process TEXT NOT NULL, pid INTEGER, name TEXT NOT NULL, labels TEXT NOT NULL,
+            value TEXT NOT NULL, PRIMARY KEY (process, name, labels));
+        CREATE TABLE IF NOT EXISTS previews (
+            key TEXT PRIMARY KEY, spec TEXT NOT NULL, created REAL NOT NULL);
+    """
+    # Columns added to jobs after the first release
+    JOB_COLUMNS = {'timings': 'TEXT', 'owner': 'INTEGER', 'heartbeat': 'REAL'}
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            # Databases created by older versions
+            existing = {r['name'] for r in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in self.JOB_COLUMNS.items():
+                if column in existing: continue
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+                except sqlite3.OperationalError:
+                    pass  # another worker migrated first
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    # Files
+    def add(self, file_id, path, size, pages, sha256):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (file_id, path, size, pages, sha256, now, now))
+
+    def get(self, file_id):
+        """Return the file record as a dict (and mark it used), or None."""
+        conn = self._conn()
+        row = conn.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row is None or not os.path.exists(row['path']): return None
+        # The TTL is hours long; refreshing it on every thumbnail would commit on every request
+        now = time.time()
+        if row['accessed'] < now - ACCESS_RESOLUTION:
+            with conn: conn.execute("UPDATE files SET accessed = ? WHERE id = ?", (now, file_id))
+        return dict(row)
+
+    # Blobs: one stored copy per unique upload content, shared by file ids
+    def add_blob(self, sha256, path, size, pages):
+        with self._conn() as conn:
+            conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?)",
+                         (sha256, path, size, pages, time.time()))
+
+    def get_blob(self, sha256):
+        row = self._conn().execute("SELECT * FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None: return None
+        if not os.path.exists(row['path']):
+            with self._conn() as conn: conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            return None
+        return dict(row)
+
+    def add_output(self, path):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)",
+                         (path, os.path.getsize(path), time.time()))
+
+    # Preview specs, by the key in their image URLs; they outlive cached images
+    def add_preview(self, key, spec):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO previews VALUES (?, ?, ?)", (key, json.dumps(spec), time.time()))
+
+    def get_preview(self, key):
+        row = self._conn().execute("SELECT spec FROM previews WHERE key = ?", (key,)).fetchone()
+        return json.loads(row['spec']) if row else None
+
+    # Jobs
+    def create_job(self, job, max_pending, stale_after):
+        """Insert a job unless max_pending live jobs are already queued or running."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs of dead processes must not hold slots until the next sweep
+            self._fail_stale_jobs(conn, stale_after)
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if pending >= max_pending: return False
+            cols = ', '.join(job)
+            conn.execute(f"INSERT INTO jobs ({cols}) VALUES ({', '.join('?' * len(job))})",
+                         tuple(job.values()))
+        return True
+
+    def update_job(self, job_id, **fields):
+        sets = ', '.join(f"{k} = ?" for k in fields)
+        with self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET {sets} WHERE id = ?", (*fields.values(), job_id))
+
+    def update_own_job(self, job_id, owner, current, **fields):
+        """Update a job only while owner holds it with status current; False if it was failed meanwhile."""
+        sets = ', '.join(f"{k} = ?" for k in fields)
+        with self._conn() as conn:
+            return conn.execute(f"UPDATE jobs SET {sets} WHERE id = ? AND owner = ? AND status = ?",
+                                (*fields.values(), job_id, owner, current)).rowcount == 1
+
+    def get_job(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def beat_jobs(self, job_ids):
+        """Refresh the heartbeat of jobs this process is still holding."""
+        if not job_ids: return
+        with self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET heartbeat = ? WHERE id IN ({', '.join('?' * len(job_ids))})",
+                         (time.time(), *job_ids))
+
+    def fail_stale_jobs(self, stale_after):
+        with self._conn() as conn: return self._fail_stale_jobs(conn, stale_after)
+
+    @staticmethod
+    def _fail_stale_jobs(conn, stale_after):
+        # Rows from before heartbeats (and owners) were recorded count from their creation
+        now = time.time()
+        quiet = conn.execute(
+            "SELECT id, owner, COALESCE(heartbeat, created) AS beat FROM jobs "
+            "WHERE status IN ('queued', 'running') AND COALESCE(heartbeat, created) < ?",
+            (now - stale_after,)).fetchall()
+        stale = [(now, r['id']) for r in quiet if r['owner'] is None or not pid_alive(r['owner'])
+                 or r['beat'] < now - JOB_HUNG_FACTOR * stale_after]
+        conn.executemany("UPDATE jobs SET status = 'error', error = 'Worker stopped responding', finished = ? "
+                         "WHERE id = ?", stale)
+        return len(stale)
+
+    # Metrics: each server process's totals, one row per series
+    def publish_metrics(self, process, pid, series):
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO metrics VALUES (?, ?, ?, ?, ?)",
+                             [(process, pid, name, labels, value) for name, labels, value in series])
+
+    def metric_rows(self):
+        return self._conn().execute("SELECT name, labels, value FROM metrics").fetchall()
+
+    def _retire_metrics(self, conn):
+        # Totals of exited processes still count (or counters would go backwards);
+        # fold them into one 'retired' row per series so the table stays small
+        rows = conn.execute("SELECT * FROM metrics WHERE pid IS NOT NULL").fetchall()
+        dead = [r for r in rows if not pid_alive(r['pid'])]
+        if not dead: return
+        retired = {(r['name'], r['labels']): json.loads(r['value']) for r in conn.execute(
+            "SELECT * FROM metrics WHERE process = 'retired'")}
+        for r in dead:
+            key = (r['name'], r['labels'])
+            retired[key] = _add(retired.get(key), json.loads(r['value']))
+        conn.executemany("DELETE FROM metrics WHERE process = ?", [(p,) for p in {r['process'] for r in dead}])
+        conn.executemany("INSERT OR REPLACE INTO metrics VALUES ('retired', NULL, ?, ?, ?)",
+                         [(name, labels, json.dumps(value)) for (name, labels), value in retired.items()])
+
+    # Eviction
+    def sweep(self, ttl, quota, job_retention, job_stale_after):
+        """Fail abandoned jobs, delete expired inputs and outputs, then the oldest ones while over quota."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._fail_stale_jobs(conn, job_stale_after)
+            self._retire_metrics(conn)
+            conn.execute("DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?",
+                         (now - job_retention,))
+            # File ids expire on their own; a stored copy lives while any id uses it
+            conn.execute("DELETE FROM files WHERE accessed < ?", (now - ttl,))
+            # Previews are re-registered each time the UI lays a job out
+            conn.execute("DELETE FROM previews WHERE created < ?", (now - ttl,))
+            # (last use, size, kind, path) for everything we store
+            entries = [(r['accessed'], r['size'], 'input', r['path']) for r in conn.execute(
+                "SELECT path, MAX(accessed) AS accessed, MAX(size) AS size FROM files GROUP BY path")]
+            entries += [(0, r['size'], 'input', r['path']) for r in conn.execute(
+                "SELECT path, size FROM blobs WHERE path NOT IN (SELECT path FROM files)")]
+            entries += [(r['created'], r['size'], 'output', r['path'])
+                        for r in conn.execute("SELECT * FROM outputs")]
+        entries.sort()
+
+        total = sum(e[1] for e in entries)
+        doomed = []
+        for last_used, size, kind, path in entries:
+            if last_used >= now - ttl and total <= quota: break
+            doomed.append((kind, path))
+            total -= size
+
+        for kind, path in doomed:
+            with conn:
+                for table in (('files', 'blobs') if kind == 'input' else ('outputs', 'sheets')):
+                    conn.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        self._sweep_orphans(now - ttl)
+        return [path for _, path in doomed]
+
+    def _sweep_orphans(self, cutoff):
+        # pynup_* files left behind by older versions or crashed workers
+        conn = self._conn()
+        known = {r[0] for r in conn.execute(
+            "SELECT path FROM files UNION SELECT path FROM blobs UNION SELECT path FROM outputs")}
+        for e in os.scandir(DATA_DIR):
+            if not e.name.startswith('pynup_') or not e.is_file() or e.path in known: continue
+            try:
+                if e.stat().st_mtime < cutoff: os.remove(e.path)
+            except FileNotFoundError:
+                pass
+
+os.makedirs(DATA_DIR, exist_ok=True)
+FILES = FileRegistry(os.path.join(DATA_DIR, 'pynup.db'))
+# Output sheets live in the same database, so the sweep can drop them with their files
+SHEETS = SheetIndex(FILES.db_path)
+
+def _sweeper():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        try:
+            for path in FILES.sweep(FILE_TTL, STORAGE_QUOTA, JOB_RETENTION, JOB_STALE_AFTER):
+                DOC_POOL.discard(path)
+        except Exception as e:
+            app.logger.warning("Storage sweep failed: %s", e)
+
+def _metrics_publisher():
+    while True:
+        time.sleep(METRICS_PUBLISH)
+        try:
+            publish_metrics()
+        except Exception as e:
+            app.logger.warning("Publishing metrics failed: %s", e)
+
+_background_started = False
+
+def start_background():
+    """Start the storage sweeper and metrics publisher once per server process.
+
+    Called from the server entry points (gunicorn.conf.py, __main__) rather than
+    on import, so tools and worker processes importing this module stay passive.
+    """
+    global _background_started
+    if _background_started: return
+    _background_started = True
+    threading.Thread(target=_sweeper, name='pynup-sweeper', daemon=True).start()
+    threading.Thread(target=_metrics_publisher, name='pynup-metrics', daemon=True).start()
 
 # --- BACKEND PROCESSING LOGIC ---
-def process_pdf_logic(file_orders, settings, output_path):
-    n_up = int(settings.get('n_up', 1))
-    invert = settings.get('invert', False)
-    border = settings.get('border', False)
-    low_dpi = settings.get('low_dpi', False)
-    dpi = 100 if low_dpi else 150
-    orient = settings.get('orientation', 'auto')
-    
-    use_vector = not (invert or low_dpi)
-
-    input_docs = []
-    page_map = [] 
+def resolve_sources(file_orders):
+    """Map /process queue entries to impose() sources; unknown ids are skipped."""
+    sources = []
+    for item in file_orders:
+        entry = FILES.get(item['id'])
+        if entry is None:
+            continue
+        sources.append({'path': entry['path'], 'sha256': entry['sha256'],
+                        'selected_pages': item.get('selected_pages', 'all')})
+    return sources
 
+def process_pdf_logic(file_orders, settings, output_path, progress=None, stats=None):
+    """Impose the queued (uploaded) files onto output sheets and save to output_path."""
+    return impose(resolve_sources(file_orders), settings, output_path, progress, stats, SHEETS)
+
+def index_sheets(path, stats):
+    """Record where the sheets of a finished output live so later jobs can reuse them."""
+    keys = stats.pop('sheet_keys', None)
+    if not keys: return
     try:
-        # 1. Load Documents & Map Pages
-        for item in file_orders:
-            fid = item['id']
-            if fid not in FILE_STORAGE:
-                continue
-                
-            f_path = FILE_STORAGE[fid]
-            doc = fitz.open(f_path)
-            input_docs.append(doc)
-            
-            selection = item.get('selected_pages', 'all')
-            if selection == 'all':
-                indices = range(len(doc))
-            else:
-                indices = [int(x) for x in selection]
-            
-            for p in indices:
-                if 0 <= p < len(doc):
-                    page_map.append((len(input_docs)-1, p))
-
-        if not page_map:
-            raise Exception("No pages selected in the queue.")
-
-        # 2. Setup Output Document
-        out_doc = fitz.open()
-        A4_SHORT, A4_LONG = 595, 842 
-        
-        # Orientation & Grid Logic
-        pw, ph = A4_SHORT, A4_LONG # Default Portrait
-        cols, rows = 1, 1
-
-        if n_up == 1:
-            if orient == 'auto':
-                if page_map:
-                    ref = input_docs[page_map[0][0]][page_map[0][1]]
-                    pw, ph = ref.rect.width, ref.rect.height
-            elif orient == 'landscape': pw, ph = A4_LONG, A4_SHORT
-            else: pw, ph = A4_SHORT, A4_LONG
-            
-        elif n_up == 2:
-            is_land = (orient == 'landscape' or orient == 'auto')
-            pw, ph = (A4_LONG, A4_SHORT) if is_land else (A4_SHORT, A4_LONG)
-            cols, rows = (2, 1) if is_land else (1, 2)
-            
-        elif n_up == 4:
-            is_land = (orient == 'landscape')
-            pw, ph = (A4_LONG, A4_SHORT) if is_land else (A4_SHORT, A4_LONG)
-            cols, rows = 2, 2
-            
-        elif n_up == 6:
-            # 2x3 for 6-Up Landscape
-            is_land = (orient == 'landscape' or orient == 'auto')
-            if is_land:
-                pw, ph = A4_LONG, A4_SHORT
-                cols, rows = 2, 3 
-            else:
-                pw, ph = A4_SHORT, A4_LONG
-                cols, rows = 2, 3
-
-        cell_w, cell_h = pw / cols, ph / rows
-        pages_per_sheet = n_up
-        num_sheets = math.ceil(len(page_map) / pages_per_sheet)
-
-        # 3. Render Pages
-        for sheet_idx in range(num_sheets):
-            out_page = out_doc.new_page(width=pw, height=ph)
-            
-            for i in range(pages_per_sheet):
-                global_idx = (sheet_idx * pages_per_sheet) + i
-                if global_idx >= len(page_map): break
-                
-                doc_idx, p_num = page_map[global_idx]
-                src_doc = input_docs[doc_idx]
-                src_page = src_doc[p_num]
-                
-                # Calculate Grid Position
-                c = i % cols
-                r = i // cols
-                x = c * cell_w
-                y = r * cell_h
-                rect = fitz.Rect(x, y, x+cell_w, y+cell_h)
-                
-                if use_vector:
-                    out_page.show_pdf_page(rect, src_doc, p_num)
-                else:
-                    # Raster path
-                    mat = fitz.Matrix(dpi/72, dpi/72)
-                    pix = src_page.get_pixmap(matrix=mat, alpha=False)
-                    if invert: pix.invert_irect(pix.irect)
-                    img_data = pix.tobytes("jpeg", jpg_quality=85)
-                    out_page.insert_image(rect, stream=img_data)
-                    pix = None
-                
-                if border:
-                    out_page.draw_rect(rect, color=(0,0,0), width=0.5)
-
-        out_doc.save(output_path)
-        out_doc.close()
+        SHEETS.add(path, keys)
+    except Exception as e:
+        app.logger.warning("Could not index sheets of %s: %s", path, e)
+
+# --- THUMBNAILS ---
+THUMB_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pynup-thumbs')
+
+def thumbnail_key(sha256, page):
+    return DiskCache.make_key(sha256, page, 'thumb', THUMB_SCALE)
+
+def render_thumbnail(doc, page):
+    pix = doc.load_page(page).get_pixmap(matrix=fitz.Matrix(THUMB_SCALE, THUMB_SCALE))
+    return pix.tobytes("png")
+
+def pregenerate_thumbnails(path, sha256):
+    """Fill THUMB_CACHE for a freshly uploaded file, in page order."""
+    try:
+        with DOC_POOL.checkout(path) as doc: count = len(doc)
+        for i in range(count):
+            key = thumbnail_key(sha256, i)
+            if THUMB_CACHE.contains(key): continue
+            # Check out per page so requests for the same file are never held up
+            with DOC_POOL.checkout(path) as doc:
+                data = render_thumbnail(doc, i)
+            THUMB_CACHE.put(key, data)
+    except Exception as e:
+        app.logger.warning("Thumbnail pre-generation failed for %s: %s", path, e)
+
+
+# --- PREVIEWS ---
+# Settings that change how a sheet looks; everything else (dpi, output profile,
+# workers, ...) only affects the final PDF
+PREVIEW_SETTINGS = ('n_up', 'orientation', 'invert', 'border')
+
+def preview_spec(file_orders, settings):
+    """Normalized job spec for a preview, plus its cache key."""
+    spec = {
+        'files': [{'id': item['id'], 'selected_pages': item.get('selected_pages', 'all')} for item in file_orders],
+        'settings': {k: settings[k] for k in PREVIEW_SETTINGS if k in settings},
+    }
+    spec['settings']['n_up'] = int(spec['settings'].get('n_up', 1))
+    return spec, DiskCache.make_key('preview', spec)
+
+# --- BACKGROUND JOBS ---
+JOB_EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='pynup-job')
+# Ids of jobs queued or running in this process, kept alive by _heartbeat
+ACTIVE_JOBS = set()
+_heartbeat_lock = threading.Lock()
+_heartbeat_started = False
+
+def _heartbeat():
+    while True:
+        time.sleep(JOB_HEARTBEAT)
+        try:
+            FILES.beat_jobs(list(ACTIVE_JOBS))
+        except Exception as e:
+            app.logger.warning("Job heartbeat failed: %s", e)
+
+def _start_heartbeat():
+    global _heartbeat_started
+    with _heartbeat_lock:
+        if _heartbeat_started: return
+        _heartbeat_started = True
+    threading.Thread(target=_heartbeat, name='pynup-heartbeat', daemon=True).start()
+
+def _job_view(job):
+    view = {k: v for k, v in job.items() if k != 'output_path'}
+    view['timings'] = json.loads(job['timings']) if job.get('timings') else None
+    return view
+
+def _run_job(job_id, file_orders, settings):
+    last = {'stage': None, 'at': 0.0}
+
+    def progress(stage, done, total):
+        # Throttle writes to the shared registry; stage changes always go through
+        now = time.time()
+        if stage != last['stage'] or now - last['at'] >= 0.5 or done == total:
+            FILES.update_job(job_id, stage=stage, done=done, total=total)
+            last.update(stage=stage, at=now)
+
+    job = FILES.get_job(job_id)
+    owner = os.getpid()
+    stats = {}
+    start = time.perf_counter()
+    try:
+        # A job failed as stale meanwhile stays failed; its client has been told so
+        if not FILES.update_own_job(job_id, owner, 'queued', status='running', started=time.time()): return
+        process_pdf_logic(file_orders, settings, job['output_path'], progress, stats)
+        stats['wall'] = time.perf_counter() - start
+        record_impose_stats(stats, 'job')
+        JOBS_TOTAL.inc(mode='job', result='done')
+        FILES.add_output(job['output_path'])
+        index_sheets(job['output_path'], stats)
+        FILES.update_own_job(job_id, owner, 'running', status='done', stage='done', finished=time.time(),
+                             timings=json.dumps(stats))
+    except Exception as e:
+        JOBS_TOTAL.inc(mode='job', result='error')
+        FILES.update_own_job(job_id, owner, 'running', status='error', error=str(e), finished=time.time())
+    finally:
+        ACTIVE_JOBS.discard(job_id)
+
+def submit_job(file_orders, settings):
+    """Queue a processing job; returns the job record or None when full."""
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id, 'status': 'queued', 'stage': 'queued', 'done': 0, 'total': 0,
+        'error': None, 'created': time.time(), 'started': None, 'finished': None, 'timings': None,
+        'output_path': os.path.join(DATA_DIR, f"pynup_processed_{job_id[:6]}.pdf"),
+        'owner': os.getpid(), 'heartbeat': time.time(),
+    }
+    if not FILES.create_job(job, JOB_WORKERS + JOB_QUEUE_LIMIT, JOB_STALE_AFTER):
+        return None
+    _start_heartbeat()
+    ACTIVE_JOBS.add(job_id)
+    JOB_EXECUTOR.submit(_run_job, job_id, file_orders, settings)
+    return job
+
+
+# --- UPLOADS ---
+UPLOADS_TOTAL = Counter('pynup_uploads_total', 'Completed uploads by whether the content was new.', ('result',))
+
+def stream_to_disk(stream, path, hasher=None, mode='wb'):
+    """Copy a file-like stream to path in chunks; returns the bytes written."""
+    size = 0
+    with open(path, mode) as f:
+        for chunk in iter(lambda: stream.read(UPLOAD_CHUNK), b''):
+            if hasher is not None: hasher.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+class HashingFile(io.FileIO):
+    """Part file opened for writing that hashes and counts what is written to it."""
+
+    def __init__(self, path, limit):
+        super().__init__(path, 'w+')
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.limit = limit
+
+    def write(self, data):
+        if self.size + len(data) > self.limit: raise RequestEntityTooLarge()
+        n = super().write(data)
+        self.sha256.update(memoryview(data)[:n])
+        self.size += n
+        return n
+
+def receive_multipart():
+    """Stream the 'file' part of a multipart request to disk; returns (name, HashingFile).
+
+    Werkzeug writes each file part into our stream_factory's file as it parses
+    the body, instead of spooling the whole body first like request.files.
+    """
+    if (request.content_length or 0) > MAX_UPLOAD_BYTES: raise RequestEntityTooLarge()
+    parts = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        parts.append(HashingFile(os.path.join(DATA_DIR, f"pynup_part_{uuid.uuid4().hex}"), MAX_UPLOAD_BYTES))
+        return parts[-1]
+
+    keep = None
+    try:
+        parser = FormDataParser(stream_factory, silent=False)
+        _, _, files = parser.parse(request.stream, request.mimetype, request.content_length,
+                                   request.mimetype_params)
+        if 'file' not in files: raise ValueError('No file part')
+        file = files['file']
+        if file.filename == '': raise ValueError('No selected file')
+        keep = file.stream
+        return file.filename, keep
     finally:
-        for doc in input_docs: doc.close()
+        for part in parts:
+            part.close()
+            if part is not keep: os.remove(part.name)
+
+def store_upload(tmp_path, sha256, ext):
+    """Move a received upload into content-addressed storage and give it a file id.
+
+    Identical content is stored (and its pages counted) once; every upload of
+    it gets its own file id pointing at the shared copy.
+    """
+    blob = FILES.get_blob(sha256)
+    if blob is not None:
+        os.remove(tmp_path)
+        UPLOADS_TOTAL.inc(result='duplicate')
+    else:
+        path = os.path.join(DATA_DIR, f"pynup_blob_{sha256}{ext or '.pdf'}")
+        os.replace(tmp_path, path)
+        t = time.perf_counter()
+        try:
+            with DOC_POOL.checkout(path) as doc: pages = len(doc)
+        except Exception:
+            DOC_POOL.discard(path)
+            os.remove(path)
+            raise
+        STAGE_SECONDS.observe(time.perf_counter() - t, op='upload', stage='open')
+        FILES.add_blob(sha256, path, os.path.getsize(path), pages)
+        THUMB_EXECUTOR.submit(pregenerate_thumbnails, path, sha256)
+        UPLOADS_TOTAL.inc(result='new')
+        blob = {'path': path, 'size': os.path.getsize(path), 'pages': pages}
+
+    file_id = str(uuid.uuid4())
+    FILES.add(file_id, blob['path'], blob['size'], blob['pages'], sha256)
+    return file_id, blob['pages']
+
+def _part_path(upload_id):
+    # Resumable upload state is just the partial file; its size is the offset
+    if len(upload_id) != 32 or any(c not in '0123456789abcdef' for c in upload_id): return None
+    return os.path.join(DATA_DIR, f"pynup_part_{upload_id}")
+
+
+# --- FRONTEND ---
+# `python frontend/build.py` writes index.html and minified, content-hashed
+# bundles, each with .gz and .br siblings, to static/dist; the build is committed.
+# It is read on the first page request, so importing this module never needs it.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSET_DIR = os.path.join(BASE_DIR, 'static', 'dist')
+ASSET_TYPES = {'.js': 'text/javascript', '.css': 'text/css'}
+
+_frontend = None
+_frontend_lock = threading.Lock()
+
+def read_variants(name):
+    """{encoding: bytes} for a built file and its precompressed siblings."""
+    variants = {}
+    for encoding, ext in (('identity', ''), ('gzip', '.gz'), ('br', '.br')):
+        path = os.path.join(ASSET_DIR, name + ext)
+        if os.path.exists(path):
+            with open(path, 'rb') as f: variants[encoding] = f.read()
+    return variants
+
+def load_frontend():
+    """Return (index variants, index ETag, {asset name: variants}), or None without a build."""
+    global _frontend
+    with _frontend_lock:
+        if _frontend is None:
+            try:
+                with open(os.path.join(ASSET_DIR, 'manifest.json')) as f: manifest = json.load(f)
+            except FileNotFoundError:
+                return None
+            index = read_variants('index.html')
+            _frontend = (index, hashlib.sha256(index['identity']).hexdigest()[:16],
+                         {name: read_variants(name) for name in manifest.values()})
+        return _frontend
+
+def send_variant(variants, etag, mimetype, cache_control):
+    """Serve the smallest encoding the client accepts, answering 304 on a matching ETag."""
+    encoding = next((e for e in ('br', 'gzip') if e in variants and request.accept_encodings[e]), 'identity')
+    tag = etag if encoding == 'identity' else f"{etag}-{encoding}"
+    headers = {'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains(tag):
+        return Response(status=304, headers={**headers, 'ETag': f'"{tag}"'})
+    resp = Response(variants[encoding], mimetype=mimetype, headers=headers)
+    if encoding != 'identity': resp.headers['Content-Encoding'] = encoding
+    resp.set_etag(tag)
+    return resp
 
 
 # --- FLASK ROUTES ---
 
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_request(response):
+    if request.endpoint not in (None, 'metrics', 'static'):
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                                endpoint=request.endpoint, status=response.status_code)
+    return response
+
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    frontend = load_frontend()
+    if frontend is None:
+        return Response("Frontend not built: run python frontend/build.py\n", status=503, mimetype='text/plain')
+    index_variants, index_etag, _ = frontend
+    # Revalidated on every visit (a cheap 304) so a new build is picked up at once
+    return send_variant(index_variants, index_etag, 'text/html', 'no-cache')
+
+@app.route('/assets/<name>', methods=['GET'])
+def get_asset(name):
+    frontend = load_frontend()
+    variants = frontend[2].get(name) if frontend else None
+    if variants is None: return jsonify({'error': 'Not found'}), 404
+    # Names carry a content hash, so a URL's content never changes
+    return send_variant(variants, name, ASSET_TYPES[os.path.splitext(name)[1]],
+                        'public, max-age=31536000, immutable')
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    """Upload a whole file, either as multipart 'file' or as the raw body with ?name=."""
     try:
-        if 'file' not in request.files: return jsonify({'error': 'No file part'}), 400
-        file = request.files['file']
-        if file.filename == '': return jsonify({'error': 'No selected file'}), 400
-
-        file_id = str(uuid.uuid4())
-        ext = os.path.splitext(file.filename)[1]
-        temp_path = os.path.join(tempfile.gettempdir(), f"pynup_{file_id}{ext}")
-        file.save(temp_path)
-        FILE_STORAGE[file_id] = temp_path
-        
-        with fitz.open(temp_path) as doc: count = len(doc)
+        t = time.perf_counter()
+        if request.mimetype == 'multipart/form-data':
+            try:
+                name, part = receive_multipart()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            tmp_path, size, sha256 = part.name, part.size, part.sha256.hexdigest()
+        else:
+            name = request.args.get('name', 'upload.pdf')
+            tmp_path = os.path.join(DATA_DIR, f"pynup_part_{uuid.uuid4().hex}")
+            hasher = hashlib.sha256()
+            try:
+                size = stream_to_disk(request.stream, tmp_path, hasher)
+            except Exception:
+                if os.path.exists(tmp_path): os.remove(tmp_path)
+                raise
+            sha256 = hasher.hexdigest()
+        STAGE_SECONDS.observe(time.perf_counter() - t, op='upload', stage='receive')
+        if size == 0:
+            os.remove(tmp_path)
+            return jsonify({'error': 'Empty upload'}), 400
+        BYTES_TOTAL.inc(size, direction='upload')
+
+        file_id, count = store_upload(tmp_path, sha256, os.path.splitext(name)[1])
+        return jsonify({'id': file_id, 'pages': count, 'message': 'Upload successful'})
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'Upload too large'}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _open_upload_sessions():
+    """Count part files still in use, removing those idle past UPLOAD_IDLE_TTL."""
+    cutoff = time.time() - UPLOAD_IDLE_TTL
+    count = 0
+    for e in os.scandir(DATA_DIR):
+        if not e.name.startswith('pynup_part_'): continue
+        try:
+            if e.stat().st_mtime < cutoff: os.remove(e.path)
+            else: count += 1
+        except FileNotFoundError:
+            pass
+    return count
+
+@app.route('/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload; send chunks with PUT /uploads/<id> and Content-Range."""
+    if _open_upload_sessions() >= MAX_UPLOAD_SESSIONS:
+        return jsonify({'error': 'Too many uploads in progress, try again shortly'}), 429
+    upload_id = uuid.uuid4().hex
+    open(_part_path(upload_id), 'wb').close()
+    return jsonify({'upload_id': upload_id, 'offset': 0, 'chunk_size': 8 * UPLOAD_CHUNK}), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(upload_id):
+    path = _part_path(upload_id)
+    if path is None or not os.path.exists(path): return jsonify({'error': 'Upload not found'}), 404
+    offset = os.path.getsize(path)
+    if request.method == 'GET': return jsonify({'offset': offset})
+
+    # Content-Range: bytes <start>-<end>/<total>; only the next chunk in order is accepted
+    crange = request.headers.get('Content-Range', '')
+    try:
+        start = int(crange.split()[1].split('-')[0])
+    except (IndexError, ValueError):
+        return jsonify({'error': 'Content-Range header required'}), 400
+    if start != offset: return jsonify({'error': 'Unexpected offset', 'offset': offset}), 409
+
+    size = stream_to_disk(request.stream, path, mode='ab')
+    if offset + size > MAX_UPLOAD_BYTES:
+        os.remove(path)
+        return jsonify({'error': 'Upload too large'}), 413
+    BYTES_TOTAL.inc(size, direction='upload')
+    return jsonify({'offset': offset + size})
+
+@app.route('/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    path = _part_path(upload_id)
+    if path is None or not os.path.exists(path): return jsonify({'error': 'Upload not found'}), 404
+    try:
+        t = time.perf_counter()
+        sha256 = sha256_file(path)
+        STAGE_SECONDS.observe(time.perf_counter() - t, op='upload', stage='hash')
+        name = request.args.get('name', 'upload.pdf')
+        file_id, count = store_upload(path, sha256, os.path.splitext(name)[1])
         return jsonify({'id': file_id, 'pages': count, 'message': 'Upload successful'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/thumbnails/<file_id>', methods=['GET'])
 def get_thumbnails(file_id):
-    if file_id not in FILE_STORAGE: return jsonify({'error': 'File not found'}), 404
+    """List thumbnail URLs, optionally for a page range (?start=&count=)."""
+    entry = FILES.get(file_id)
+    if entry is None: return jsonify({'error': 'File not found'}), 404
+    try:
+        total = entry['pages']
+        start = max(0, int(request.args.get('start', 0)))
+        count = int(request.args.get('count', total))
+        pages = range(start, min(total, start + count))
+        return jsonify({'thumbnails': [f"/thumbnails/{file_id}/{i}.png" for i in pages],
+                        'start': start, 'total': total})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/thumbnails/<file_id>/<int:page>.png', methods=['GET'])
+def get_thumbnail(file_id, page):
+    entry = FILES.get(file_id)
+    if entry is None: return jsonify({'error': 'File not found'}), 404
+    key = thumbnail_key(entry['sha256'], page)
+    if request.if_none_match.contains(key):
+        return Response(status=304, headers={'ETag': f'"{key}"'})
+    try:
+        data = THUMB_CACHE.get(key)
+        if data is None:
+            t = time.perf_counter()
+            with DOC_POOL.checkout(entry['path']) as doc:
+                if not 0 <= page < len(doc): return jsonify({'error': 'Page not found'}), 404
+                data = render_thumbnail(doc, page)
+            STAGE_SECONDS.observe(time.perf_counter() - t, op='thumbnail', stage='render')
+            THUMB_CACHE.put(key, data)
+        resp = Response(data, mimetype='image/png')
+        resp.set_etag(key)
+        # Keys are content hashes, so a given URL never changes
+        resp.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+        return resp
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/preview', methods=['POST'])
+def create_preview():
+    """Layout of a job without rendering it: sheet size, grid and per-sheet pages.
+
+    Returns image URLs for sheets start..start+count (default: the first one).
+    """
+    try:
+        data = request.json
+        file_orders = data.get('files', [])
+        if not file_orders: return jsonify({'error': 'No files in queue'}), 400
+        spec, key = preview_spec(file_orders, data.get('settings', {}))
+        sources = resolve_sources(spec['files'])
+        if len(sources) != len(spec['files']): return jsonify({'error': 'File not found'}), 404
+        t = time.perf_counter()
+        plan = plan_layout(sources, spec['settings'])
+        STAGE_SECONDS.observe(time.perf_counter() - t, op='preview', stage='layout')
+        FILES.add_preview(key, spec)
+
+        pw, ph, cols, rows = plan['layout']
+        start = max(0, int(request.args.get('start', data.get('start', 0))))
+        count = max(0, int(request.args.get('count', data.get('count', 1))))
+        n_up, page_map = plan['n_up'], plan['page_map']
+        sheets = []
+        for sheet in range(start, min(start + count, plan['sheets'])):
+            cells = page_map[sheet * n_up:(sheet + 1) * n_up]
+            sheets.append({'sheet': sheet, 'url': f"/preview/{key}/{sheet}.png",
+                           'pages': [{'id': spec['files'][d]['id'], 'page': p} for d, p in cells]})
+        return jsonify({'key': key, 'pages': len(page_map), 'total_sheets': plan['sheets'],
+                        'page_size': [pw, ph], 'grid': [cols, rows], 'sheets': sheets})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/preview/<key>/<int:sheet>.png', methods=['GET'])
+def get_preview(key, sheet):
+    image_key = DiskCache.make_key(key, sheet, PREVIEW_DPI)
+    if request.if_none_match.contains(image_key):
+        return Response(status=304, headers={'ETag': f'"{image_key}"'})
     try:
-        path = FILE_STORAGE[file_id]
-        doc = fitz.open(path)
-        thumbnails = []
-        limit = min(len(doc), 100) 
-        for i in range(limit):
-            page = doc.load_page(i)
-            pix = page.get_pixmap(matrix=fitz.Matrix(0.2, 0.2))
-            data = pix.tobytes("png")
-            b64_str = base64.b64encode(data).decode('utf-8')
-            thumbnails.append(f"data:image/png;base64,{b64_str}")
-        return jsonify({'thumbnails': thumbnails, 'total': len(doc)})
+        data = PREVIEW_CACHE.get(image_key)
+        if data is None:
+            spec = FILES.get_preview(key)
+            if spec is None: return jsonify({'error': 'Preview not found'}), 404
+            sources = resolve_sources(spec['files'])
+            if len(sources) != len(spec['files']): return jsonify({'error': 'File expired'}), 410
+            t = time.perf_counter()
+            plan = plan_layout(sources, spec['settings'])
+            if not 0 <= sheet < plan['sheets']: return jsonify({'error': 'Sheet not found'}), 404
+            data = render_preview(sources, plan, spec['settings'], sheet, PREVIEW_DPI)
+            STAGE_SECONDS.observe(time.perf_counter() - t, op='preview', stage='render')
+            PREVIEW_CACHE.put(image_key, data)
+        resp = Response(data, mimetype='image/png')
+        resp.set_etag(image_key)
+        # The key covers file ids, selections and settings, so a URL never changes
+        resp.headers['Cache-Control'] = 'private, max-age=86400, immutable'
+        return resp
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -180,252 +977,86 @@ def process():
         settings = data.get('settings', {})
         if not file_orders: return jsonify({'error': 'No files in queue'}), 400
 
-        temp_dir = tempfile.gettempdir()
         output_filename = f"pynup_processed_{uuid.uuid4().hex[:6]}.pdf"
-        output_path = os.path.join(temp_dir, output_filename)
+        output_path = os.path.join(DATA_DIR, output_filename)
         
-        process_pdf_logic(file_orders, settings, output_path)
-        return send_file(output_path, as_attachment=True, download_name="processed_document.pdf")
+        stats = {}
+        start = time.perf_counter()
+        process_pdf_logic(file_orders, settings, output_path, stats=stats)
+        stats['wall'] = time.perf_counter() - start
+        record_impose_stats(stats, 'sync')
+        JOBS_TOTAL.inc(mode='sync', result='done')
+        FILES.add_output(output_path)
+        index_sheets(output_path, stats)
+        resp = send_file(output_path, as_attachment=True, download_name="processed_document.pdf")
+        resp.headers['Server-Timing'] = server_timing(stats)
+        if stats['output']['bytes_saved'] is not None:
+            resp.headers['X-Output-Bytes-Saved'] = str(stats['output']['bytes_saved'])
+        return resp
     except Exception as e:
+        JOBS_TOTAL.inc(mode='sync', result='error')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(all_cache_stats())
+
+def all_cache_stats(totals=None):
+    # Hits and misses of every server process; bytes as this process last saw the shared directory
+    totals = totals if totals is not None else metric_totals()
+    stats = {}
+    for name, cache in CACHES.items():
+        st = stats[name] = cache.stats()
+        for field in ('hits', 'misses'):
+            st[field] = totals.get(f"pynup_cache_{field}_total", {}).get((name,), 0)
+    return stats
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    totals = metric_totals()
+    lines = []
+    for metric in METRICS: lines += metric.render(totals.get(metric.name, {}))
+    caches = all_cache_stats(totals)
+    for field, kind, help in (('hits', 'counter', 'Cache lookups served from disk.'),
+                              ('misses', 'counter', 'Cache lookups that had to render.'),
+                              ('bytes', 'gauge', 'Bytes currently held in the cache.')):
+        name = f"pynup_cache_{field}_total" if kind == 'counter' else f"pynup_cache_{field}"
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{cache="{cache}"}} {st[field]}' for cache, st in caches.items()]
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    data = request.json or {}
+    file_orders = data.get('files', [])
+    settings = data.get('settings', {})
+    if not file_orders: return jsonify({'error': 'No files in queue'}), 400
+
+    job = submit_job(file_orders, settings)
+    if job is None: return jsonify({'error': 'Server busy, try again shortly'}), 429
+    return jsonify({'job_id': job['id'], 'status': job['status']}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = FILES.get_job(job_id)
+    if job is None: return jsonify({'error': 'Job not found'}), 404
+    if job['status'] in ('queued', 'running') and (job['heartbeat'] or job['created']) < time.time() - JOB_STALE_AFTER:
+        FILES.fail_stale_jobs(JOB_STALE_AFTER)
+        job = FILES.get_job(job_id)
+    return jsonify(_job_view(job))
+
+@app.route('/jobs/<job_id>/download', methods=['GET'])
+def job_download(job_id):
+    job = FILES.get_job(job_id)
+    if job is None: return jsonify({'error': 'Job not found'}), 404
+    if job['status'] != 'done': return jsonify({'error': f"Job is {job['status']}"}), 409
+    if not os.path.exists(job['output_path']): return jsonify({'error': 'Output has expired'}), 410
+    name = request.args.get('name', 'processed_document.pdf')
+    return send_file(job['output_path'], as_attachment=True, download_name=name)
 
-# --- FRONTEND TEMPLATE ---
-HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="en" class="dark">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>PyNUp Web</title>
-    <script src="https://cdn.tailwindcss.com"></script>
-    <script>
-        tailwind.config = {
-            darkMode: 'class',
-        }
-    </script>
-    <script crossorigin src="https://unpkg.com/react@18/umd/react.production.min.js"></script>
-    <script crossorigin src="https://unpkg.com/react-dom@18/umd/react-dom.production.min.js"></script>
-    <script src="https://unpkg.com/@babel/standalone/babel.min.js"></script>
-
-    <style>
-        body { font-family: 'Segoe UI', sans-serif; transition: background-color 0.3s, color 0.3s; }
-        .drag-active { border-color: #3b82f6; background-color: rgba(59, 130, 246, 0.1); }
-        .scrollbar-hide::-webkit-scrollbar { display: none; }
-    </style>
-</head>
-<body class="bg-gray-100 text-slate-800 dark:bg-slate-950 dark:text-slate-200">
-    <div id="root"></div>
-
-    <script type="text/babel">
-        const { useState, useEffect } = React;
-
-        // ICONS
-        const IconUpload = () => <svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"/><polyline points="17 8 12 3 7 8"/><line x1="12" y1="3" x2="12" y2="15"/></svg>;
-        const IconGrid = () => <svg xmlns="http://www.w3.org/2000/svg" width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><rect x="3" y="3" width="7" height="7"/><rect x="14" y="3" width="7" height="7"/><rect x="14" y="14" width="7" height="7"/><rect x="3" y="14" width="7" height="7"/></svg>;
-        const IconTrash = () => <svg xmlns="http://www.w3.org/2000/svg" width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><polyline points="3 6 5 6 21 6"/><path d="M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"/></svg>;
-        const IconCheck = () => <svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="3"><polyline points="20 6 9 17 4 12"/></svg>;
-        const IconX = () => <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><line x1="18" y1="6" x2="6" y2="18"/><line x1="6" y1="6" x2="18" y2="18"/></svg>;
-        const IconSun = () => <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><circle cx="12" cy="12" r="5"/><line x1="12" y1="1" x2="12" y2="3"/><line x1="12" y1="21" x2="12" y2="23"/><line x1="4.22" y1="4.22" x2="5.64" y2="5.64"/><line x1="18.36" y1="18.36" x2="19.78" y2="19.78"/><line x1="1" y1="12" x2="3" y2="12"/><line x1="21" y1="12" x2="23" y2="12"/><line x1="4.22" y1="19.78" x2="5.64" y2="18.36"/><line x1="18.36" y1="5.64" x2="19.78" y2="4.22"/></svg>;
-        const IconMoon = () => <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><path d="M21 12.79A9 9 0 1 1 11.21 3 7 7 0 0 0 21 12.79z"/></svg>;
-
-        function PageSelectorModal({ isOpen, file, onClose, onSave }) {
-            const [thumbnails, setThumbnails] = useState([]);
-            const [selected, setSelected] = useState(new Set());
-            const [loading, setLoading] = useState(true);
-
-            useEffect(() => {
-                if (isOpen && file) {
-                    setLoading(true);
-                    if (file.selectedPages === 'all') {
-                        setSelected(new Set(Array.from({length: file.pages}, (_, i) => i)));
-                    } else {
-                        setSelected(new Set(file.selectedPages));
-                    }
-                    fetch(`/thumbnails/${file.id}`)
-                        .then(r => r.json())
-                        .then(data => {
-                            if(data.thumbnails) setThumbnails(data.thumbnails);
-                            setLoading(false);
-                        })
-                        .catch(err => { console.error(err); setLoading(false); });
-                }
-            }, [isOpen, file]);
-
-            if (!isOpen) return null;
-
-            const togglePage = (idx) => {
-                const next = new Set(selected);
-                if (next.has(idx)) next.delete(idx); else next.add(idx);
-                setSelected(next);
-            };
-
-            const handleSave = () => {
-                if (selected.size === file.pages) onSave('all');
-                else onSave(Array.from(selected).sort((a,b) => a-b));
-                onClose();
-            };
-
-            return (
-                <div className="fixed inset-0 z-50 flex items-center justify-center bg-black/80 backdrop-blur-sm p-4">
-                    <div className="bg-white dark:bg-slate-900 w-full max-w-5xl h-[85vh] rounded-2xl border border-gray-200 dark:border-slate-700 flex flex-col shadow-2xl overflow-hidden">
-                        <div className="p-4 border-b border-gray-200 dark:border-slate-700 flex justify-between items-center bg-gray-50 dark:bg-slate-800/50">
-                            <div><h3 className="text-lg font-bold text-gray-800 dark:text-white flex items-center gap-2"><IconGrid /> Select Pages: {file.name}</h3><p className="text-sm text-gray-500 dark:text-slate-400">{selected.size} / {file.pages} pages selected</p></div>
-                            <button onClick={onClose} className="text-gray-500 hover:text-gray-900 dark:text-slate-400 dark:hover:text-white"><IconX /></button>
-                        </div>
-                        <div className="p-3 bg-gray-50 dark:bg-slate-950 border-b border-gray-200 dark:border-slate-800 flex gap-2">
-                            <button onClick={() => setSelected(new Set(Array.from({length: file.pages}, (_, i) => i)))} className="px-3 py-1 text-xs font-medium bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 hover:bg-gray-100 dark:hover:bg-slate-700 text-gray-700 dark:text-white rounded">Select All</button>
-                            <button onClick={() => setSelected(new Set())} className="px-3 py-1 text-xs font-medium bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 hover:bg-gray-100 dark:hover:bg-slate-700 text-gray-700 dark:text-white rounded">Deselect All</button>
-                            <button onClick={() => { const next = new Set(); for(let i=0; i<file.pages; i++) if(!selected.has(i)) next.add(i); setSelected(next); }} className="px-3 py-1 text-xs font-medium bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 hover:bg-gray-100 dark:hover:bg-slate-700 text-gray-700 dark:text-white rounded">Invert</button>
-                        </div>
-                        <div className="flex-1 overflow-y-auto p-6 bg-gray-100 dark:bg-slate-950">
-                            {loading ? <div className="text-gray-500 dark:text-slate-500 text-center">Loading thumbnails...</div> : (
-                                <div className="grid grid-cols-2 sm:grid-cols-3 md:grid-cols-4 lg:grid-cols-6 gap-4">
-                                    {thumbnails.map((src, idx) => {
-                                        const isSel = selected.has(idx);
-                                        return (
-                                            <div key={idx} onClick={() => togglePage(idx)} className={`relative cursor-pointer group rounded-lg overflow-hidden border-2 transition-all ${isSel ? 'border-blue-500 shadow-lg shadow-blue-500/20' : 'border-gray-200 dark:border-slate-800 opacity-60 hover:opacity-100 hover:border-gray-400 dark:hover:border-slate-600'}`}>
-                                                <div className="aspect-[1/1.4] bg-white dark:bg-slate-900"><img src={src} className="w-full h-full object-contain" /></div>
-                                                <div className={`absolute top-2 right-2 w-6 h-6 rounded-full flex items-center justify-center text-white text-xs font-bold transition ${isSel ? 'bg-blue-500' : 'bg-black/50'}`}>{isSel ? <IconCheck /> : idx+1}</div>
-                                            </div>
-                                        )
-                                    })}
-                                </div>
-                            )}
-                        </div>
-                        <div className="p-4 border-t border-gray-200 dark:border-slate-800 bg-white dark:bg-slate-900 flex justify-end gap-3">
-                            <button onClick={onClose} className="px-4 py-2 text-sm font-medium text-gray-600 dark:text-slate-400 hover:text-gray-900 dark:hover:text-white">Cancel</button>
-                            <button onClick={handleSave} className="px-6 py-2 text-sm font-bold bg-blue-600 hover:bg-blue-500 text-white rounded-lg shadow-lg">Save Selection</button>
-                        </div>
-                    </div>
-                </div>
-            );
-        }
-
-        function App() {
-            const [files, setFiles] = useState([]); 
-            const [settings, setSettings] = useState({ n_up: "1", orientation: "auto", invert: false, low_dpi: false, border: false });
-            const [isProcessing, setIsProcessing] = useState(false);
-            const [modal, setModal] = useState({ open: false, fileId: null });
-            const [theme, setTheme] = useState('dark');
-
-            useEffect(() => {
-                if (theme === 'dark') document.documentElement.classList.add('dark');
-                else document.documentElement.classList.remove('dark');
-            }, [theme]);
-
-            const toggleTheme = () => setTheme(prev => prev === 'dark' ? 'light' : 'dark');
-
-            const handleFiles = async (fileList) => {
-                const newUploads = Array.from(fileList).map(f => ({ tempId: Math.random(), fileObj: f, name: f.name, pages: 0, status: 'uploading', selectedPages: 'all' }));
-                setFiles(prev => [...prev, ...newUploads]);
-                for (let item of newUploads) {
-                    const fd = new FormData(); fd.append('file', item.fileObj);
-                    try {
-                        const res = await fetch('/upload', { method: 'POST', body: fd });
-                        const data = await res.json();
-                        setFiles(prev => prev.map(f => f.tempId === item.tempId ? { ...f, id: data.id, pages: data.pages, status: 'done' } : f));
-                    } catch (err) {
-                        alert(`Failed to upload ${item.name}`);
-                        setFiles(prev => prev.filter(f => f.tempId !== item.tempId));
-                    }
-                }
-            };
-
-            const openSelector = (id) => { const f = files.find(f => f.id === id); if (f && f.status === 'done') setModal({ open: true, fileId: id }); };
-            const saveSelection = (fileId, newSelection) => { setFiles(prev => prev.map(f => f.id === fileId ? { ...f, selectedPages: newSelection } : f)); };
-
-            const handleSubmit = async () => {
-                if (files.some(f => f.status === 'uploading')) return alert("Please wait for uploads to finish");
-                if (files.length === 0) return alert("Queue is empty");
-                setIsProcessing(true);
-                try {
-                    const payload = { files: files.map(f => ({ id: f.id, selected_pages: f.selectedPages })), settings };
-                    const res = await fetch('/process', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
-                    if (!res.ok) throw new Error("Processing failed");
-                    
-                    const blob = await res.blob();
-                    const url = window.URL.createObjectURL(blob);
-                    const a = document.createElement('a');
-                    a.href = url;
-                    
-                    const firstFile = files[0].name.replace('.pdf', '');
-                    const nUpSuffix = settings.n_up > 1 ? `_${settings.n_up}up` : '';
-                    const effectSuffix = settings.invert ? '_inverted' : '';
-                    const countSuffix = files.length > 1 ? '_merged' : '';
-                    a.download = `${firstFile}${countSuffix}${nUpSuffix}${effectSuffix}.pdf`;
-                    
-                    document.body.appendChild(a); a.click(); document.body.removeChild(a);
-                } catch (err) { alert(err.message); } finally { setIsProcessing(false); }
-            };
-
-            const activeFile = modal.fileId ? files.find(f => f.id === modal.fileId) : null;
-
-            return (
-                <div className="min-h-screen p-6 md:p-12 max-w-6xl mx-auto transition-colors duration-300">
-                    {activeFile && <PageSelectorModal isOpen={modal.open} file={activeFile} onClose={() => setModal({ open: false, fileId: null })} onSave={(sel) => saveSelection(modal.fileId, sel)} />}
-                    
-                    <header className="mb-10 flex items-center justify-between">
-                        <div>
-                            <h1 className="text-4xl font-extrabold bg-gradient-to-r from-blue-500 to-indigo-500 bg-clip-text text-transparent mb-2">PyNUp Web</h1>
-                            <p className="text-gray-500 dark:text-slate-400">Visual PDF Layout Tool</p>
-                        </div>
-                        <button onClick={toggleTheme} className="p-3 rounded-full bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 text-gray-500 dark:text-slate-400 hover:text-blue-500 dark:hover:text-blue-400 transition shadow-sm">
-                            {theme === 'dark' ? <IconSun /> : <IconMoon />}
-                        </button>
-                    </header>
-
-                    <div className="grid grid-cols-1 lg:grid-cols-3 gap-8">
-                        <div className="lg:col-span-2 space-y-6">
-                            <div className="border-2 border-dashed border-gray-300 dark:border-slate-700 bg-white dark:bg-slate-800/30 rounded-xl p-8 text-center hover:bg-gray-50 dark:hover:bg-slate-800/50 transition relative">
-                                <input type="file" multiple accept="application/pdf" className="absolute inset-0 opacity-0 cursor-pointer" onChange={(e) => handleFiles(e.target.files)} />
-                                <div className="flex flex-col items-center gap-4"><div className="w-16 h-16 bg-blue-500/10 rounded-full flex items-center justify-center text-blue-500 dark:text-blue-400"><IconUpload /></div><div><p className="text-lg font-medium text-gray-700 dark:text-slate-200">Drag & Drop or Click to Upload</p></div></div>
-                            </div>
-                            <div className="bg-white dark:bg-slate-900 rounded-xl border border-gray-200 dark:border-slate-800 overflow-hidden min-h-[300px] shadow-sm">
-                                {files.length === 0 ? <div className="p-8 text-center text-gray-400 dark:text-slate-500 italic mt-10">Drop PDFs here to begin</div> : 
-                                    <div className="divide-y divide-gray-100 dark:divide-slate-800">{files.map((file, idx) => (
-                                        <div key={file.tempId || file.id} className="p-4 flex items-center gap-4 hover:bg-gray-50 dark:hover:bg-slate-800/50 transition group">
-                                            <div className="w-8 text-center text-gray-400 dark:text-slate-600 font-mono text-xs">{idx+1}</div>
-                                            <div className="flex-1 min-w-0">
-                                                <div className="flex items-center gap-2"><p className="font-medium text-gray-800 dark:text-slate-200 truncate">{file.name}</p>{file.status === 'uploading' && <span className="text-xs text-blue-500 dark:text-blue-400 animate-pulse">Uploading...</span>}</div>
-                                                {file.status === 'done' && <p className="text-xs text-gray-500 dark:text-slate-500">{file.selectedPages === 'all' ? `All ${file.pages} pages included` : `${file.selectedPages.length} of ${file.pages} pages selected`}</p>}
-                                            </div>
-                                            {file.status === 'done' && <button onClick={() => openSelector(file.id)} className="px-3 py-1.5 text-xs font-bold bg-gray-100 dark:bg-slate-800 hover:bg-blue-600 text-blue-600 dark:text-blue-400 hover:text-white rounded border border-gray-200 dark:border-slate-700 transition flex items-center gap-2"><IconGrid /> Select Pages</button>}
-                                            <button onClick={() => setFiles(f => f.filter((_, i) => i !== idx))} className="p-2 text-gray-400 dark:text-slate-500 hover:text-red-500 dark:hover:text-red-400 opacity-0 group-hover:opacity-100 transition"><IconTrash /></button>
-                                        </div>
-                                    ))}</div>
-                                }
-                            </div>
-                        </div>
-
-                        <div className="bg-white dark:bg-slate-900 rounded-xl border border-gray-200 dark:border-slate-800 p-6 h-fit space-y-8 shadow-sm">
-                            <div>
-                                <h2 className="text-xl font-bold text-gray-900 dark:text-white mb-4">Settings</h2>
-                                <div className="space-y-6">
-                                    <div><label className="text-xs font-bold text-gray-500 dark:text-slate-500 uppercase tracking-wider mb-2 block">Layout</label><div className="grid grid-cols-4 gap-2">{['1', '2', '4', '6'].map(n => (<button key={n} onClick={() => setSettings({...settings, n_up: n})} className={`py-2 rounded font-bold text-sm transition ${settings.n_up == n ? 'bg-blue-600 text-white shadow-lg shadow-blue-500/25' : 'bg-gray-100 dark:bg-slate-950 text-gray-500 dark:text-slate-400 hover:bg-gray-200 dark:hover:bg-slate-800'}`}>{n}-Up</button>))}</div></div>
-                                    <div><label className="text-xs font-bold text-gray-500 dark:text-slate-500 uppercase tracking-wider mb-2 block">Orientation</label><select value={settings.orientation} onChange={(e) => setSettings({...settings, orientation: e.target.value})} className="w-full bg-gray-50 dark:bg-slate-950 border border-gray-200 dark:border-slate-700 rounded p-2.5 text-gray-800 dark:text-slate-200 text-sm outline-none focus:border-blue-500"><option value="auto">Auto (Detect)</option><option value="portrait">Portrait</option><option value="landscape">Landscape</option></select></div>
-                                    <div className="space-y-3">
-                                        <label className="flex items-center gap-3 cursor-pointer group select-none"><div className={`w-5 h-5 rounded border flex items-center justify-center transition ${settings.invert ? 'bg-purple-600 border-purple-500' : 'border-gray-300 dark:border-slate-600 bg-gray-50 dark:bg-slate-950'}`}>{settings.invert && <IconCheck className="text-white"/>}</div><input type="checkbox" className="hidden" checked={settings.invert} onChange={() => setSettings({...settings, invert: !settings.invert})} /><span className="text-sm text-gray-600 dark:text-slate-300">Invert Colors</span></label>
-                                        <label className="flex items-center gap-3 cursor-pointer group select-none"><div className={`w-5 h-5 rounded border flex items-center justify-center transition ${settings.low_dpi ? 'bg-amber-600 border-amber-500' : 'border-gray-300 dark:border-slate-600 bg-gray-50 dark:bg-slate-950'}`}>{settings.low_dpi && <IconCheck className="text-white"/>}</div><input type="checkbox" className="hidden" checked={settings.low_dpi} onChange={() => setSettings({...settings, low_dpi: !settings.low_dpi})} /><span className="text-sm text-gray-600 dark:text-slate-300">Low DPI (Save RAM)</span></label>
-                                        <label className="flex items-center gap-3 cursor-pointer group select-none"><div className={`w-5 h-5 rounded border flex items-center justify-center transition ${settings.border ? 'bg-emerald-600 border-emerald-500' : 'border-gray-300 dark:border-slate-600 bg-gray-50 dark:bg-slate-950'}`}>{settings.border && <IconCheck className="text-white"/>}</div><input type="checkbox" className="hidden" checked={settings.border} onChange={() => setSettings({...settings, border: !settings.border})} /><span className="text-sm text-gray-600 dark:text-slate-300">Add Borders</span></label>
-                                    </div>
-                                </div>
-                            </div>
-                            <button onClick={handleSubmit} disabled={isProcessing} className="w-full py-4 bg-gradient-to-r from-blue-600 to-indigo-600 hover:from-blue-500 hover:to-indigo-500 text-white font-bold rounded-xl shadow-lg shadow-blue-500/25 transition disabled:opacity-50 disabled:cursor-not-allowed">{isProcessing ? 'Processing...' : 'Merge & Download PDF'}</button>
-                        </div>
-                    </div>
-                </div>
-            );
-        }
-
-        const root = ReactDOM.createRoot(document.getElementById('root'));
-        root.render(<App />);
-    </script>
-</body>
-</html>
-"""
 
 if __name__ == '__main__':
+    start_background()
     print("Starting Flask Server...")
     print("Open http://127.0.0.1:5000 in your browser")
     app.run(host='0.0.0.0', debug=True, port=5000)
\ No newline at end of file
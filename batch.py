@@ -0,0 +1,254 @@
+"""Headless batch imposition: n-up many PDFs without the web server.
+
+    python batch.py 'scans/*.pdf' -o out/ --n-up 4 --border
+    python batch.py --manifest nightly.json --jobs 4 --jsonl
+
+Glob mode makes one job per matched file, written to OUT_DIR with the same
+name suffixes as the web UI (report.pdf -> report_4up.pdf). A manifest is JSON:
+
+    {"settings": {"n_up": 2},                   # defaults for every job
+     "jobs": [{"output": "out/a.pdf",
+               "inputs": [{"path": "a.pdf", "pages": "1-3,7"}, "b.pdf"],
+               "settings": {"invert": true}}]}
+
+Relative paths in a manifest are resolved against the manifest's directory.
+Page selections are 1-based ranges or "all". Jobs run in parallel processes;
+an output newer than all of its inputs (and the manifest) and stamped with the
+same inputs, pages and settings is skipped unless --force is given. Progress
+goes to stderr, or to stdout as JSON lines with --jsonl. Exits non-zero if any
+job failed.
+
+Only the engine is used: no web server, upload registry or data directory.
+With --sheet-index DB, finished outputs are indexed in that SQLite file and
+reruns copy unchanged sheets from them instead of rebuilding.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF
+
+import engine
+
+
+# --- JOBS ---
+def parse_pages(spec):
+    """'all', a list of 1-based numbers, or '1-3,7' -> impose() selected_pages (0-based)."""
+    if spec is None or spec == 'all': return 'all'
+    if isinstance(spec, list): return [int(p) - 1 for p in spec]
+    pages = []
+    for part in str(spec).split(','):
+        part = part.strip()
+        if not part: continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            pages.extend(range(int(first) - 1, int(last)))
+        else:
+            pages.append(int(part) - 1)
+    return pages
+
+def output_name(path, settings):
+    """Default output file name, matching the web UI's download names."""
+    base = os.path.splitext(os.path.basename(path))[0]
+    n_up = int(settings.get('n_up', 1))
+    return base + (f"_{n_up}up" if n_up > 1 else '') + ('_inverted' if settings.get('invert') else '') + '.pdf'
+
+def jobs_from_globs(patterns, out_dir, settings):
+    paths = sorted({p for pattern in patterns for p in glob.glob(pattern, recursive=True)
+                    if p.lower().endswith('.pdf')})
+    return [{'name': p, 'output': os.path.join(out_dir, output_name(p, settings)),
+             'sources': [{'path': p, 'selected_pages': 'all'}], 'settings': dict(settings), 'deps': [p]}
+            for p in paths]
+
+def jobs_from_manifest(path, settings):
+    with open(path) as f:
+        manifest = json.load(f)
+    root = os.path.dirname(os.path.abspath(path))
+    defaults = {**settings, **manifest.get('settings', {})}
+    jobs = []
+    for i, entry in enumerate(manifest.get('jobs', [])):
+        job_settings = {**defaults, **entry.get('settings', {})}
+        sources = []
+        for item in entry['inputs']:
+            if isinstance(item, str): item = {'path': item}
+            sources.append({'path': os.path.join(root, item['path']),
+                            'selected_pages': parse_pages(item.get('pages'))})
+        output = entry.get('output') or output_name(sources[0]['path'], job_settings)
+        jobs.append({'name': entry.get('name') or os.path.basename(output) or f"job-{i}",
+                     'output': os.path.join(root, output), 'sources': sources,
+                     'settings': job_settings, 'deps': [s['path'] for s in sources] + [path]})
+    return jobs
+
+# Outputs carry a hash of the job that built them in their Info dictionary
+STAMP_KEY = 'PyNUpJob'
+
+def job_fingerprint(job):
+    """Hash of what an output is built from: sources, page selections and settings."""
+    spec = {'sources': [[os.path.abspath(s['path']), s['selected_pages']] for s in job['sources']],
+            'settings': {k: v for k, v in job['settings'].items() if k != 'workers'}}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+def stamp_output(path, fingerprint):
+    with fitz.open(path) as doc:
+        info = doc.xref_get_key(-1, 'Info')
+        if info[0] != 'xref':
+            doc.set_metadata(doc.metadata or {})
+            info = doc.xref_get_key(-1, 'Info')
+        doc.xref_set_key(int(info[1].split()[0]), STAMP_KEY, f"({fingerprint})")
+        # Appends a few hundred bytes instead of rewriting the file
+        doc.saveIncr()
+
+def read_stamp(path):
+    with fitz.open(path) as doc:
+        kind, value = doc.xref_get_key(-1, f'Info/{STAMP_KEY}')
+    return value if kind == 'string' else None
+
+def up_to_date(job):
+    """True when the output is newer than every input and was built by this exact job."""
+    try:
+        built = os.path.getmtime(job['output'])
+        if not all(os.path.getmtime(dep) <= built for dep in job['deps']): return False
+        return read_stamp(job['output']) == job_fingerprint(job)
+    except Exception:
+        return False
+
+
+# --- RUNNER ---
+def _init_worker(render_workers):
+    # Every job process has its own engine pool; split the cores between them
+    engine.RENDER_WORKERS = render_workers
+
+def _run_job(job, events, index_path=None):
+    last = {'stage': None, 'at': 0.0}
+
+    def progress(stage, done, total):
+        # Throttle cross-process events; stage changes always go through
+        now = time.time()
+        if stage != last['stage'] or now - last['at'] >= 0.5 or done == total:
+            events.put({'event': 'progress', 'job': job['name'], 'stage': stage, 'done': done, 'total': total})
+            last.update(stage=stage, at=now)
+
+    os.makedirs(os.path.dirname(os.path.abspath(job['output'])), exist_ok=True)
+    # Write beside the target and rename, so an interrupted job never looks up to date
+    tmp = f"{job['output']}.{os.getpid()}.tmp"
+    sheets = engine.SheetIndex(index_path) if index_path else None
+    stats = {}
+    start = time.perf_counter()
+    try:
+        engine.impose(job['sources'], job['settings'], tmp, progress, stats, sheets)
+        stamp_output(tmp, job['fingerprint'])
+        os.replace(tmp, job['output'])
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    stats['wall'] = time.perf_counter() - start
+    keys = stats.pop('sheet_keys', None)
+    if sheets and keys: sheets.add(job['output'], keys)
+    return stats
+
+def run(jobs, parallel, force=False, emit=print, index_path=None):
+    """Run jobs across `parallel` processes; returns the number that failed."""
+    # Jobs sharing an output would overwrite each other (and never be up to date)
+    writers = {}
+    for job in jobs:
+        writers.setdefault(os.path.abspath(job['output']), []).append(job)
+
+    failed = 0
+    pending = []
+    for job in jobs:
+        others = [other['name'] for other in writers[os.path.abspath(job['output'])] if other is not job]
+        if others:
+            failed += 1
+            emit({'event': 'error', 'job': job['name'],
+                  'error': f"output {job['output']} is also written by {', '.join(others)}"})
+            continue
+        job['fingerprint'] = job_fingerprint(job)
+        if not force and up_to_date(job):
+            emit({'event': 'skipped', 'job': job['name'], 'output': job['output']})
+        else:
+            pending.append(job)
+    if not pending: return failed
+
+    parallel = max(1, min(parallel, len(pending)))
+    ctx = multiprocessing.get_context('forkserver')
+    with ctx.Manager() as manager, ProcessPoolExecutor(
+            max_workers=parallel, mp_context=ctx, initializer=_init_worker,
+            initargs=(max(1, engine.RENDER_WORKERS // parallel),)) as pool:
+        events = manager.Queue()
+        futures = {}
+        for job in pending:
+            futures[pool.submit(_run_job, job, events, index_path)] = job
+            emit({'event': 'queued', 'job': job['name'], 'output': job['output']})
+        remaining = set(futures)
+        while remaining:
+            finished = {f for f in remaining if f.done()}
+            while not events.empty(): emit(events.get())
+            for future in finished:
+                job = futures[future]
+                try:
+                    stats = future.result()
+                    emit({'event': 'done', 'job': job['name'], 'output': job['output'],
+                          'wall': stats['wall'], 'pages': stats['pages'], 'sheets': stats['sheets'],
+                          'stages': stats['stages'], 'bytes_out': stats['bytes_out']})
+                except Exception as e:
+                    failed += 1
+                    emit({'event': 'error', 'job': job['name'], 'error': str(e)})
+            remaining -= finished
+            if remaining: time.sleep(0.1)
+    return failed
+
+
+# --- REPORTING ---
+def format_event(e):
+    kind = e['event']
+    if kind == 'progress':
+        return f"{e['job']}: {e['stage']} {e['done']}/{e['total']}"
+    if kind == 'done':
+        stages = " ".join(f"{k}={v:.3f}" for k, v in sorted(e['stages'].items()))
+        return (f"{e['job']}: done in {e['wall']:.2f}s, {e['pages']} pages -> {e['sheets']} sheets, "
+                f"{e['bytes_out'] / 1024:.1f} KB  {stages}")
+    if kind == 'error':
+        return f"{e['job']}: FAILED: {e['error']}"
+    return f"{e['job']}: {kind} -> {e['output']}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Impose PDFs in bulk without the PyNUp web server.")
+    parser.add_argument('inputs', nargs='*', help="input PDF globs (one job per file)")
+    parser.add_argument('--manifest', help="JSON manifest of jobs (see module docstring)")
+    parser.add_argument('-o', '--out-dir', default='.', help="output directory for glob inputs")
+    parser.add_argument('--n-up', type=int, choices=(1, 2, 4, 6))
+    parser.add_argument('--orientation', choices=('auto', 'portrait', 'landscape'))
+    parser.add_argument('--invert', action='store_true', default=None)
+    parser.add_argument('--invert-mode', choices=('vector', 'raster'))
+    parser.add_argument('--border', action='store_true', default=None)
+    parser.add_argument('--low-dpi', action='store_true', default=None)
+    parser.add_argument('--profile', dest='output_profile', choices=tuple(engine.OUTPUT_PROFILES))
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help="jobs run in parallel")
+    parser.add_argument('--force', action='store_true', help="rebuild outputs that are up to date")
+    parser.add_argument('--sheet-index', metavar='DB', help="SQLite file indexing output sheets for reuse on reruns")
+    parser.add_argument('--jsonl', action='store_true', help="emit progress as JSON lines on stdout")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.manifest:
+        parser.error("give input globs or --manifest")
+
+    keys = ('n_up', 'orientation', 'invert', 'invert_mode', 'border', 'low_dpi', 'output_profile')
+    settings = {k: getattr(args, k) for k in keys if getattr(args, k) is not None}
+    jobs = jobs_from_manifest(args.manifest, settings) if args.manifest else []
+    if args.inputs:
+        jobs += jobs_from_globs(args.inputs, args.out_dir, settings)
+
+    if args.jsonl:
+        emit = lambda e: print(json.dumps(e), flush=True)
+    else:
+        emit = lambda e: print(format_event(e), file=sys.stderr, flush=True)
+    index_path = os.path.abspath(args.sheet_index) if args.sheet_index else None
+    failed = run(jobs, args.jobs, args.force, emit, index_path)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Benchmarks for the imposition engine (engine.impose) on a synthetic corpus.
+
+    python bench.py                                   # quick run, 10/100 pages
+    python bench.py --sizes 10 500 5000 --json run.json
+    python bench.py --json new.json --compare run.json
+
+Every case runs in a fresh process so peak RSS is per case: the highest of
+that process and its render pool workers. Results are
+printed as a table and optionally written as JSON for later --compare runs.
+Everything runs offline; the corpus is generated once and reused.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import tempfile
+import itertools
+import multiprocessing
+
+import fitz  # PyMuPDF
+
+import engine
+
+KINDS = ('text', 'image', 'vector')
+N_UPS = (1, 2, 4, 6)
+ORIENTATIONS = ('auto', 'portrait', 'landscape')
+PATHS = ('vector', 'raster')
+DEFAULT_SIZES = (10, 100)
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua imposition sheet page grid").split()
+
+
+# --- CORPUS ---
+def _text_page(doc, rng):
+    page = doc.new_page()
+    text = "\n".join(" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(60))
+    page.insert_textbox(fitz.Rect(36, 36, 559, 806), text, fontsize=9)
+
+def _image_page(doc, rng, images):
+    page = doc.new_page()
+    # A few distinct images per page, drawn from a shared pool as real decks reuse logos/figures
+    for i in range(4):
+        x, y = 40 + (i % 2) * 270, 60 + (i // 2) * 380
+        page.insert_image(fitz.Rect(x, y, x + 250, y + 350), stream=rng.choice(images))
+
+def _vector_page(doc, rng):
+    page = doc.new_page()
+    shape = page.new_shape()
+    for _ in range(400):
+        p1 = fitz.Point(rng.uniform(0, 595), rng.uniform(0, 842))
+        p2 = fitz.Point(rng.uniform(0, 595), rng.uniform(0, 842))
+        if rng.random() < 0.5:
+            shape.draw_line(p1, p2)
+        else:
+            shape.draw_bezier(p1, fitz.Point(p1.x, p2.y), fitz.Point(p2.x, p1.y), p2)
+        shape.finish(color=(rng.random(), rng.random(), rng.random()), width=rng.uniform(0.2, 2))
+    shape.commit()
+
+def _make_images(rng, count=8):
+    images = []
+    for _ in range(count):
+        w, h = 200, 280
+        # Smooth gradient plus noise: compresses like a photo, not like a flat fill
+        base = [rng.randrange(256) for _ in range(3)]
+        samples = bytearray(w * h * 3)
+        for i in range(w * h):
+            y, x = divmod(i, w)
+            for c in range(3):
+                samples[i * 3 + c] = (base[c] + x + y + rng.randrange(32)) & 0xFF
+        pix = fitz.Pixmap(fitz.csRGB, w, h, bytes(samples), False)
+        images.append(pix.tobytes("jpeg", jpg_quality=80))
+    return images
+
+def make_corpus_pdf(kind, pages, path, seed=0):
+    rng = random.Random(f"{kind}-{seed}")
+    images = _make_images(rng) if kind == 'image' else None
+    doc = fitz.open()
+    for _ in range(pages):
+        if kind == 'text': _text_page(doc, rng)
+        elif kind == 'image': _image_page(doc, rng, images)
+        else: _vector_page(doc, rng)
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def corpus_path(corpus_dir, kind, pages):
+    path = os.path.join(corpus_dir, f"{kind}_{pages}.pdf")
+    if not os.path.exists(path):
+        tmp = path + ".tmp"
+        make_corpus_pdf(kind, pages, tmp)
+        os.replace(tmp, path)
+    return path
+
+
+# --- RUNNER ---
+def _run_case(path, settings, out_path, queue):
+    stats = {}
+    start = time.perf_counter()
+    engine.impose([{'path': path, 'selected_pages': 'all'}], settings, out_path, stats=stats)
+    stats['wall'] = time.perf_counter() - start
+    engine.shutdown_pool()
+    # ru_maxrss is KiB on Linux; pool workers report theirs with each result
+    stats['peak_rss'] = 1024 * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, engine.worker_maxrss())
+    queue.put(stats)
+
+def run_case(path, settings, out_path):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(path, settings, out_path, queue))
+    proc.start()
+    stats = queue.get()
+    proc.join()
+    return stats
+
+def case_settings(n_up, orientation, path, workers, profile=None, measure_savings=False):
+    settings = {'n_up': n_up, 'orientation': orientation, 'tile_cache': False}
+    if profile: settings['output_profile'] = profile
+    if measure_savings: settings['measure_savings'] = True
+    if path == 'raster':
+        settings.update(invert=True, invert_mode='raster')
+    if workers: settings['workers'] = workers
+    return settings
+
+def case_id(r):
+    return f"{r['kind']}/{r['pages']}p/{r['n_up']}up/{r['orientation']}/{r['path']}"
+
+def run(args):
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    out_path = os.path.join(tempfile.gettempdir(), f"pynup_bench_{os.getpid()}.pdf")
+    results = []
+    cases = itertools.product(args.kinds, args.sizes, args.n_up, args.orientations, args.paths)
+    try:
+        for kind, pages, n_up, orientation, path in cases:
+            src = corpus_path(args.corpus_dir, kind, pages)
+            settings = case_settings(n_up, orientation, path, args.workers, args.profile, args.measure_savings)
+            runs = [run_case(src, settings, out_path) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r['wall'])
+            result = {
+                'kind': kind, 'pages': pages, 'n_up': n_up, 'orientation': orientation, 'path': path,
+                'wall': best['wall'], 'pages_per_sec': best['pages'] / best['wall'],
+                'stages': best['stages'], 'peak_rss': max(r['peak_rss'] for r in runs),
+                'bytes_in': best['bytes_in'], 'bytes_out': best['bytes_out'],
+                'tile_formats': best.get('tile_formats', {}), 'output': best.get('output'),
+            }
+            results.append(result)
+            print_row(result)
+    finally:
+        if os.path.exists(out_path): os.remove(out_path)
+    return results
+
+
+# --- REPORTING ---
+def print_header():
+    print(f"{'case':<40} {'wall s':>8} {'pages/s':>9} {'rss MB':>8} {'out KB':>9}  stages")
+
+def print_row(r, baseline=None):
+    line = (f"{case_id(r):<40} {r['wall']:>8.3f} {r['pages_per_sec']:>9.1f} "
+            f"{r['peak_rss'] / 2**20:>8.1f} {r['bytes_out'] / 1024:>9.1f}  "
+            + " ".join(f"{k}={v:.3f}" for k, v in sorted(r['stages'].items())))
+    if baseline:
+        delta = (r['wall'] - baseline['wall']) / baseline['wall'] * 100
+        line += f"  ({delta:+.1f}% wall vs baseline)"
+    print(line, flush=True)
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {case_id(r): r for r in json.load(f)['results']}
+    print(f"\nComparison against {baseline_path}:")
+    print_header()
+    for r in results:
+        print_row(r, baseline.get(case_id(r)))
+
+def metadata():
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'pymupdf': fitz.VersionBind,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PyNUp imposition engine.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="page counts (10-5000)")
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=KINDS)
+    parser.add_argument('--n-up', type=int, nargs='+', choices=N_UPS, default=N_UPS)
+    parser.add_argument('--orientations', nargs='+', choices=ORIENTATIONS, default=ORIENTATIONS)
+    parser.add_argument('--paths', nargs='+', choices=PATHS, default=PATHS)
+    parser.add_argument('--workers', type=int, help="raster render workers (default: engine setting)")
+    parser.add_argument('--profile', choices=tuple(engine.OUTPUT_PROFILES), help="output profile (default: engine setting)")
+    parser.add_argument('--measure-savings', action='store_true',
+                        help="also write each output unoptimized to report bytes saved (adds a write)")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per case; the fastest is kept")
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'pynup_bench_corpus'))
+    parser.add_argument('--json', help="write machine-readable results here")
+    parser.add_argument('--compare', help="baseline JSON from an earlier --json run")
+    args = parser.parse_args(argv)
+
+    print_header()
+    results = run(args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    sys.exit(main())
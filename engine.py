@@ -0,0 +1,918 @@
+"""PyNUp imposition engine: lays source PDF pages out n-up onto output sheets.
+
+Shared by the web app (app.py), the batch CLI (batch.py) and the benchmarks
+(bench.py). Nothing here knows about Flask, uploads or the server's registry,
+so render and split worker processes only import this module and PyMuPDF.
+"""
+import os
+import json
+import math
+import tempfile
+import hashlib
+import uuid
+import sqlite3
+import struct
+import zlib
+import time
+import resource
+import threading
+import multiprocessing
+import multiprocessing.util
+from collections import OrderedDict, deque
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import fitz  # PyMuPDF
+
+# Root of everything PyNUp keeps on disk: the server's uploads, outputs and
+# database, and the engine's render caches
+DATA_DIR = os.environ.get('PYNUP_DATA_DIR', tempfile.gettempdir())
+
+# Worker processes used to rasterize pages and impose split chunks. This is per
+# process: every gunicorn worker (or batch job process) has its own pool, so
+# size it to cores / processes.
+RENDER_WORKERS = int(os.environ.get('PYNUP_RENDER_WORKERS', os.cpu_count() or 1))
+
+# Raster jobs with fewer pages than this render in the calling thread
+RASTER_POOL_MIN_PAGES = int(os.environ.get('PYNUP_RASTER_POOL_MIN_PAGES', 8))
+
+# Rendered page tiles are cached on disk up to this many bytes
+TILE_CACHE_BYTES = int(os.environ.get('PYNUP_TILE_CACHE_MB', 512)) * 1024 * 1024
+
+# Open fitz.Document handles kept around between requests
+DOC_POOL_SIZE = int(os.environ.get('PYNUP_DOC_POOL_SIZE', 32))
+DOC_POOL_BYTES = int(os.environ.get('PYNUP_DOC_POOL_MB', 512)) * 1024 * 1024
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# --- DISK CACHE ---
+class DiskCache:
+    """Byte cache on local disk, capped in size, evicting least recently used.
+
+    Entries are plain files named by key; recency is the file mtime, so several
+    server processes can share one cache directory.
+    """
+
+    def __init__(self, name, max_bytes):
+        self.dir = os.path.join(DATA_DIR, f"pynup_cache_{name}")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # The directory is created on first put, so importing never writes to disk
+        self._size = sum(e[1] for e in self._entries())
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+
+    def contains(self, key):
+        return os.path.exists(os.path.join(self.dir, key))
+
+    def get(self, key):
+        path = os.path.join(self.dir, key)
+        try:
+            with open(path, 'rb') as f: data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.count_miss()
+            return None
+        with self._lock: self.hits += 1
+        return data
+
+    def count_miss(self):
+        with self._lock: self.misses += 1
+
+    def put(self, key, data):
+        path = os.path.join(self.dir, key)
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        os.makedirs(self.dir, exist_ok=True)
+        with open(tmp, 'wb') as f: f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._size += len(data)
+            if self._size > self.max_bytes: self._evict()
+
+    def _entries(self):
+        """(mtime, size, path) of every cached file."""
+        entries = []
+        try:
+            for e in os.scandir(self.dir):
+                try:
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+                except FileNotFoundError:
+                    pass
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _evict(self):
+        # Rescan so entries written by other processes are accounted for,
+        # then drop the oldest until we are back under 90% of the cap.
+        entries = sorted(self._entries())
+        size = sum(e[1] for e in entries)
+        for _, nbytes, path in entries:
+            if size <= self.max_bytes * 0.9: break
+            try:
+                os.remove(path)
+                size -= nbytes
+            except FileNotFoundError:
+                pass
+        self._size = size
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+TILE_CACHE = DiskCache('tiles', TILE_CACHE_BYTES)
+
+# --- DOCUMENT POOL ---
+class DocumentPool:
+    """Bounded LRU of open fitz.Document handles, keyed by file path.
+
+    A handle is used by one thread at a time. If it is already checked out
+    (e.g. by a long job), the caller gets a private handle instead of waiting.
+    Idle handles are closed once the pool holds more than max_docs documents
+    or more than max_bytes of source files.
+    """
+
+    def __init__(self, max_docs, max_bytes):
+        self.max_docs = max_docs
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path -> {'doc', 'size', 'lock', 'users'}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self, path):
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                entry = self._entries[path] = {'doc': None, 'size': 0, 'lock': threading.Lock(), 'users': 0}
+            self._entries.move_to_end(path)
+            entry['users'] += 1
+
+        if not entry['lock'].acquire(blocking=False):
+            self._release(entry)
+            with fitz.open(path) as doc:
+                yield doc
+            return
+
+        try:
+            if entry['doc'] is None:
+                entry['doc'] = fitz.open(path)
+                entry['size'] = os.path.getsize(path)
+            yield entry['doc']
+        finally:
+            entry['lock'].release()
+            self._release(entry)
+
+    def _release(self, entry):
+        with self._lock:
+            entry['users'] -= 1
+            self._evict()
+
+    def _evict(self):
+        total = sum(e['size'] for e in self._entries.values())
+        for path in list(self._entries):
+            if len(self._entries) <= self.max_docs and total <= self.max_bytes: break
+            entry = self._entries[path]
+            if entry['users']: continue
+            del self._entries[path]
+            total -= entry['size']
+            if entry['doc'] is not None: entry['doc'].close()
+
+    def discard(self, path):
+        """Close the pooled handle for path once nobody is using it."""
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry['users']: return
+            del self._entries[path]
+            if entry['doc'] is not None: entry['doc'].close()
+
+DOC_POOL = DocumentPool(DOC_POOL_SIZE, DOC_POOL_BYTES)
+
+# --- WORKER POOL ---
+# One long-lived process pool, created on first use and shared by every job in
+# this process. Each job bounds its own share with a window of in-flight tasks.
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+def worker_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # Jobs run on threads, so never fork the server process itself;
+            # the fork server preloads just this module and PyMuPDF
+            ctx = multiprocessing.get_context('forkserver')
+            ctx.set_forkserver_preload(['engine'])
+            _POOL = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=ctx)
+            # A multiprocessing child joins its non-daemon children on exit, and
+            # idle pool workers never finish. Shut the pool down before that join,
+            # and before the queue feeder threads stop (their finalizers use 10).
+            multiprocessing.util.Finalize(_POOL, shutdown_pool, exitpriority=100)
+        return _POOL
+
+def shutdown_pool():
+    """Stop the shared worker pool, if any; the next job starts a new one."""
+    global _POOL
+    with _POOL_LOCK:
+        pool, _POOL = _POOL, None
+    if pool is not None: pool.shutdown(wait=True, cancel_futures=True)
+
+def _discard_pool(pool):
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool: _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+# Highest ru_maxrss pool workers have reported to this process. They are children
+# of the fork server, not of this process, so RUSAGE_CHILDREN never sees them.
+_worker_maxrss = 0
+
+def worker_maxrss():
+    """Peak RSS of any pool worker that ran a task for this process, in ru_maxrss units."""
+    return _worker_maxrss
+
+def _pool_task(fn, job):
+    return fn(job), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _pool_result(future):
+    global _worker_maxrss
+    result, maxrss = future.result()
+    _worker_maxrss = max(_worker_maxrss, maxrss)
+    return result
+
+def pool_map(fn, jobs, window):
+    """Yield fn(job) for each job in order, keeping at most `window` tasks in flight."""
+    pool = worker_pool()
+    pending = deque()
+    try:
+        for job in jobs:
+            pending.append(pool.submit(_pool_task, fn, job))
+            if len(pending) >= window: yield _pool_result(pending.popleft())
+        while pending:
+            yield _pool_result(pending.popleft())
+    except BrokenProcessPool:
+        # A worker died (OOM, segfault in MuPDF); the next job gets a fresh pool
+        _discard_pool(pool)
+        raise
+    finally:
+        for future in pending: future.cancel()
+
+# --- RASTER WORKERS ---
+# Each worker process keeps its own handles; fitz documents cannot cross processes.
+_WORKER_DOCS = {}
+_WORKER_DOCS_MAX = 8
+
+def _render_raster_page(job):
+    path, p_num, dpi, invert, quality, color_mode = job
+    doc = _WORKER_DOCS.get(path)
+    if doc is None:
+        if len(_WORKER_DOCS) >= _WORKER_DOCS_MAX:
+            for old in _WORKER_DOCS.values(): old.close()
+            _WORKER_DOCS.clear()
+        doc = _WORKER_DOCS[path] = fitz.open(path)
+    return render_tile(doc, p_num, dpi, invert, quality, color_mode)
+
+def render_tile(doc, p_num, dpi, invert, quality, color_mode):
+    # Forced gray / bilevel modes render straight into DeviceGray
+    cs = fitz.csGRAY if color_mode in ('gray', 'bilevel') else fitz.csRGB
+    mat = fitz.Matrix(dpi/72, dpi/72)
+    pix = doc[p_num].get_pixmap(matrix=mat, colorspace=cs, alpha=False)
+    if invert: pix.invert_irect(pix.irect)
+    return encode_tile(pix, color_mode, quality)
+
+# --- RASTER ENCODING ---
+# Tiles are JPEG (photographic content) or grayscale PNG (1-bit or 8-bit);
+# PNG tiles are embedded as Flate streams without re-encoding, see place_tile.
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_BILEVEL_BITS = bytes(ord('0') if i < 128 else ord('1') for i in range(256))
+
+def classify_pixmap(pix, samples=20000):
+    """Classify rendered content as 'bilevel', 'flat' (few gray levels), 'gray' or 'color'."""
+    step = max(1, (pix.width * pix.height) // samples)
+    data = pix.samples_mv
+    if pix.n >= 3:
+        stride = pix.n * step
+        r, g, b = data[0::stride], data[1::stride], data[2::stride]
+        if any(abs(x - y) > 8 or abs(x - z) > 8 for x, y, z in zip(r, g, b)):
+            return 'color'
+        levels = bytes(g)
+    else:
+        levels = bytes(data[::step])
+
+    # Anti-aliased text has about as many edge (mid-tone) pixels as dark ones;
+    # scans, photos and large tints have far more
+    mid = sum(1 for v in levels if 48 < v < 208)
+    ink = sum(1 for v in levels if v < 128)
+    if mid <= len(levels) * 0.15 and mid <= 2 * ink + len(levels) * 0.005: return 'bilevel'
+    # Flat fills and line art: a handful of levels (plus edge pixels) cover the page
+    hist = sorted(levels.count(v) for v in range(256))
+    if sum(hist[-16:]) >= len(levels) * 0.99: return 'flat'
+    return 'gray'
+
+def bilevel_png(gray):
+    """Threshold a gray pixmap into a 1-bit PNG."""
+    w, h, stride = gray.width, gray.height, gray.stride
+    samples = gray.samples
+    pad = b'0' * ((-w) % 8)
+    nbytes = (w + len(pad)) // 8
+    rows = [b'\x00' + int(samples[y*stride:y*stride + w].translate(_BILEVEL_BITS) + pad, 2).to_bytes(nbytes, 'big')
+            for y in range(h)]
+
+    def chunk(tag, body):
+        return struct.pack('>I', len(body)) + tag + body + struct.pack('>I', zlib.crc32(tag + body))
+
+    return (PNG_SIGNATURE + chunk(b'IHDR', struct.pack('>IIBBBBB', w, h, 1, 0, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + chunk(b'IEND', b''))
+
+def encode_tile(pix, color_mode, quality):
+    kind = classify_pixmap(pix) if color_mode == 'auto' else color_mode
+    if kind == 'color':
+        return pix.tobytes("jpeg", jpg_quality=quality)
+    if pix.n != 1: pix = fitz.Pixmap(fitz.csGRAY, pix)
+    if kind == 'bilevel': return bilevel_png(pix)
+    if kind == 'flat': return pix.tobytes("png")
+    return pix.tobytes("jpeg", jpg_quality=quality)
+
+def _parse_gray_png(data):
+    """(width, height, bit depth, zlib data) for a plain grayscale PNG, else None."""
+    if not data.startswith(PNG_SIGNATURE): return None
+    pos, idat, header = len(PNG_SIGNATURE), [], None
+    while pos < len(data):
+        length, tag = struct.unpack('>I4s', data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        if tag == b'IHDR': header = struct.unpack('>IIBBBBB', body)
+        elif tag == b'IDAT': idat.append(body)
+        pos += 12 + length
+    w, h, depth, color_type, _, _, interlace = header
+    if color_type != 0 or interlace: return None
+    return w, h, depth, b''.join(idat)
+
+def place_tile(doc, page, rect, data):
+    """Draw an encoded tile into rect; returns 'png' or 'jpeg'."""
+    png = _parse_gray_png(data)
+    if png is None:
+        page.insert_image(rect, stream=data)
+        return 'png' if data.startswith(PNG_SIGNATURE) else 'jpeg'
+
+    # PDF's Flate filter understands PNG row predictors, so IDAT can be used as-is
+    w, h, depth, idat = png
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, idat, compress=False)
+    for key, value in (("Type", "/XObject"), ("Subtype", "/Image"), ("Width", str(w)),
+                       ("Height", str(h)), ("ColorSpace", "/DeviceGray"),
+                       ("BitsPerComponent", str(depth)), ("Filter", "/FlateDecode"),
+                       ("DecodeParms", f"<</Predictor 15/Colors 1/BitsPerComponent {depth}/Columns {w}>>")):
+        doc.xref_set_key(xref, key, value)
+    page.insert_image(rect, xref=xref)
+    return 'png'
+
+def render_raster_pages(jobs, workers, docs):
+    """Yield encoded tiles for (path, page, dpi, invert, quality, color_mode) jobs, in job order.
+
+    Pages are rendered in the shared worker pool, with up to two per worker in
+    flight; results are yielded as soon as the next page in order is ready so
+    the caller can assemble sheets meanwhile. Small jobs are rendered here from
+    docs, a dict of the caller's open documents by path.
+    """
+    if workers <= 1 or len(jobs) < RASTER_POOL_MIN_PAGES:
+        for path, *args in jobs:
+            yield render_tile(docs[path], *args)
+        return
+    yield from pool_map(_render_raster_page, jobs, 2 * workers)
+
+def cached_raster_pages(jobs, keys, workers, docs):
+    """Like render_raster_pages, but serve tiles from TILE_CACHE when possible."""
+    cached = [TILE_CACHE.contains(k) for k in keys]
+    rendered = render_raster_pages([j for j, hit in zip(jobs, cached) if not hit], workers, docs)
+    try:
+        for job, key, hit in zip(jobs, keys, cached):
+            data = TILE_CACHE.get(key) if hit else None
+            if data is None:
+                if hit:  # evicted since we looked; render it here
+                    path, *args = job
+                    data = render_tile(docs[path], *args)
+                else:
+                    TILE_CACHE.count_miss()
+                    data = next(rendered)
+                TILE_CACHE.put(key, data)
+            yield data
+    finally:
+        rendered.close()
+
+# --- VECTOR INVERT ---
+# A white rectangle painted with the Difference blend mode inverts every colour
+# beneath it, so pages keep their text and vector content.
+INVERT_GS_NAME = 'PyNUpInvert'
+
+def fit_rect(cell, src_rect):
+    """The area show_pdf_page / insert_image fill: src_rect scaled into cell, centred."""
+    scale = min(cell.width / src_rect.width, cell.height / src_rect.height)
+    w, h = src_rect.width * scale, src_rect.height * scale
+    x0 = cell.x0 + (cell.width - w) / 2
+    y0 = cell.y0 + (cell.height - h) / 2
+    return fitz.Rect(x0, y0, x0 + w, y0 + h)
+
+def add_invert_gstate(doc):
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<</Type/ExtGState/BM/Difference>>")
+    return xref
+
+def add_invert_overlay(doc, page, rects, gs_xref):
+    ph = page.rect.height
+    ops = "".join(f"{r.x0:g} {ph - r.y1:g} {r.width:g} {r.height:g} re " for r in rects)
+    stream_xref = doc.get_new_xref()
+    doc.update_object(stream_xref, "<<>>")
+    doc.update_stream(stream_xref, f"q /{INVERT_GS_NAME} gs 1 1 1 rg {ops}f Q".encode())
+
+    contents = page.get_contents() + [stream_xref]
+    doc.xref_set_key(page.xref, "Contents", "[" + " ".join(f"{x} 0 R" for x in contents) + "]")
+
+    # xref_set_key cannot walk through indirect objects, so resolve them here
+    target, path = page.xref, "Resources/ExtGState"
+    kind, value = doc.xref_get_key(target, "Resources")
+    if kind == 'xref':
+        target, path = int(value.split()[0]), "ExtGState"
+        kind, value = doc.xref_get_key(target, "ExtGState")
+        if kind == 'xref':
+            target, path = int(value.split()[0]), None
+    key = f"{path}/{INVERT_GS_NAME}" if path else INVERT_GS_NAME
+    doc.xref_set_key(target, key, f"{gs_xref} 0 R")
+
+# --- LAYOUT ---
+def select_pages(doc, selection):
+    """Page indices of doc for a selection ('all' or indices); out-of-range ones are dropped."""
+    if selection == 'all':
+        return range(len(doc))
+    return [p for p in (int(x) for x in selection) if 0 <= p < len(doc)]
+
+A4_SHORT, A4_LONG = 595, 842
+
+def compute_layout(n_up, orient, first_rect):
+    """Sheet size and grid for a job: (pw, ph, cols, rows).
+
+    first_rect is the rect of the first selected page ('auto' 1-up keeps its size).
+    """
+    # Orientation & Grid Logic
+    pw, ph = A4_SHORT, A4_LONG # Default Portrait
+    cols, rows = 1, 1
+
+    if n_up == 1:
+        if orient == 'auto':
+            pw, ph = first_rect.width, first_rect.height
+        elif orient == 'landscape': pw, ph = A4_LONG, A4_SHORT
+        else: pw, ph = A4_SHORT, A4_LONG
+        
+    elif n_up == 2:
+        is_land = (orient == 'landscape' or orient == 'auto')
+        pw, ph = (A4_LONG, A4_SHORT) if is_land else (A4_SHORT, A4_LONG)
+        cols, rows = (2, 1) if is_land else (1, 2)
+        
+    elif n_up == 4:
+        is_land = (orient == 'landscape')
+        pw, ph = (A4_LONG, A4_SHORT) if is_land else (A4_SHORT, A4_LONG)
+        cols, rows = 2, 2
+        
+    elif n_up == 6:
+        # 2x3 for 6-Up Landscape
+        is_land = (orient == 'landscape' or orient == 'auto')
+        if is_land:
+            pw, ph = A4_LONG, A4_SHORT
+            cols, rows = 2, 3 
+        else:
+            pw, ph = A4_SHORT, A4_LONG
+            cols, rows = 2, 3
+
+    return pw, ph, cols, rows
+
+def build_sheets(out_doc, input_docs, page_map, layout, opts, sheets, timed,
+                 raster_images=None, on_sheet=None):
+    """Append the given sheet indices of page_map to out_doc; returns tile format counts.
+
+    opts holds 'n_up', 'border', 'use_vector' and 'vector_invert'. Raster tiles
+    are taken from raster_images in page_map order.
+    """
+    pw, ph, cols, rows = layout
+    cell_w, cell_h = pw / cols, ph / rows
+    pages_per_sheet = opts['n_up']
+    vector_invert = opts['vector_invert']
+    invert_gs = add_invert_gstate(out_doc) if vector_invert else None
+    tile_formats = {}
+
+    for sheet_idx in sheets:
+        out_page = out_doc.new_page(width=pw, height=ph)
+        cell_rects = []
+        invert_rects = []
+        
+        for i in range(pages_per_sheet):
+            global_idx = (sheet_idx * pages_per_sheet) + i
+            if global_idx >= len(page_map): break
+            
+            doc_idx, p_num = page_map[global_idx]
+            src_doc = input_docs[doc_idx]
+            
+            # Calculate Grid Position
+            c = i % cols
+            r = i // cols
+            x = c * cell_w
+            y = r * cell_h
+            rect = fitz.Rect(x, y, x+cell_w, y+cell_h)
+            
+            t = time.perf_counter()
+            if opts['use_vector']:
+                if vector_invert:
+                    # Paint the placed page white first so the difference
+                    # overlay has an opaque backdrop to invert
+                    placed = fit_rect(rect, src_doc[p_num].rect)
+                    out_page.draw_rect(placed, color=None, fill=(1,1,1), width=0)
+                    invert_rects.append(placed)
+                out_page.show_pdf_page(rect, src_doc, p_num)
+            else:
+                # Raster path (pages arrive in page_map order from the pool)
+                img_data = next(raster_images)
+                timed('raster', t)
+                t = time.perf_counter()
+                fmt = place_tile(out_doc, out_page, rect, img_data)
+                tile_formats[fmt] = tile_formats.get(fmt, 0) + 1
+            timed('place', t)
+            cell_rects.append(rect)
+
+        t = time.perf_counter()
+        if vector_invert: add_invert_overlay(out_doc, out_page, invert_rects, invert_gs)
+        if opts['border']:
+            for rect in cell_rects:
+                out_page.draw_rect(rect, color=(0,0,0), width=0.5)
+        timed('place', t)
+
+        if on_sheet: on_sheet(sheet_idx)
+
+    return tile_formats
+
+# --- SPLIT-AND-MERGE ---
+# Big vector jobs are cut into sheet-aligned chunks, imposed into partial PDFs
+# by worker processes and concatenated in order.
+SPLIT_MIN_SHEETS = int(os.environ.get('PYNUP_SPLIT_MIN_SHEETS', 400))
+SPLIT_CHUNK_SHEETS = int(os.environ.get('PYNUP_SPLIT_CHUNK_SHEETS', 200))
+
+def _impose_part(job):
+    paths, page_map, layout, opts, num_sheets, part_path = job
+    docs = {}
+    try:
+        input_docs = []
+        for path in paths:
+            if path not in docs: docs[path] = fitz.open(path)
+            input_docs.append(docs[path])
+        part = fitz.open()
+        build_sheets(part, input_docs, page_map, layout, opts, range(num_sheets),
+                     lambda stage, start: None)
+        part.save(part_path)
+        part.close()
+    finally:
+        for doc in docs.values(): doc.close()
+        # Drop MuPDF's resource cache so each worker's memory stays bounded by one chunk
+        fitz.TOOLS.store_shrink(100)
+    return part_path
+
+def impose_split(out_doc, input_paths, page_map, layout, opts, num_sheets, chunk, workers, on_sheets, part_dir):
+    """Impose sheets in parallel chunks (written to part_dir) and append them to out_doc in order."""
+    per_chunk = chunk * opts['n_up']
+    token = uuid.uuid4().hex[:8]
+    jobs = []
+    for n, first in enumerate(range(0, num_sheets, chunk)):
+        sheets = min(chunk, num_sheets - first)
+        part_path = os.path.join(part_dir, f"pynup_split_{token}_{n}.pdf")
+        jobs.append((input_paths, page_map[first * opts['n_up']:first * opts['n_up'] + per_chunk],
+                     layout, opts, sheets, part_path))
+
+    done = 0
+    parts = pool_map(_impose_part, jobs, workers)
+    try:
+        for job, part_path in zip(jobs, parts):
+            with fitz.open(part_path) as part:
+                out_doc.insert_pdf(part)
+            os.remove(part_path)
+            done += job[4]
+            on_sheets(done)
+    finally:
+        parts.close()
+        for job in jobs:
+            if os.path.exists(job[5]): os.remove(job[5])
+
+# --- OUTPUT OPTIMIZATION ---
+# fitz save() options per profile. 'fast' writes as-is; 'balanced' drops unused
+# and duplicate objects, compresses uncompressed streams and packs objects into
+# object streams; 'smallest' also dedupes identical stream data and recompresses
+# images and fonts.
+OUTPUT_PROFILES = {
+    'fast': {},
+    'balanced': {'garbage': 3, 'deflate': True, 'use_objstms': 1},
+    'smallest': {'garbage': 4, 'deflate': True, 'deflate_images': True, 'deflate_fonts': True,
+                 'clean': True, 'use_objstms': 1, 'compression_effort': 100},
+}
+OUTPUT_PROFILE = os.environ.get('PYNUP_OUTPUT_PROFILE', 'balanced')
+
+def save_output(doc, path, profile=OUTPUT_PROFILE, linearize=False, dedup=False, timed=None, measure=False):
+    """Save doc to path with an output profile; returns a report dict.
+
+    The document is written once, with the profile's options (stage 'save').
+    With measure, it is first written as-is and then rewritten in place (stage
+    'optimize'), so bytes_saved can be reported against the plain write;
+    otherwise bytes_plain and bytes_saved are None. dedup merges objects with
+    identical content (garbage=4: fonts and images copied in more than once),
+    whatever the profile.
+    """
+    if profile not in OUTPUT_PROFILES: raise ValueError(f"Unknown output profile: {profile}")
+    timed = timed or (lambda stage, start: None)
+    opts = dict(OUTPUT_PROFILES[profile])
+    if dedup: opts['garbage'] = 4
+    report = {'profile': profile, 'bytes_plain': None, 'bytes_saved': None, 'linearized': False}
+
+    plain = None
+    if measure:
+        t = time.perf_counter()
+        doc.save(path)
+        timed('save', t)
+        plain = report['bytes_plain'] = os.path.getsize(path)
+        report['bytes_saved'] = 0
+        if not opts and not linearize: return report
+
+    t = time.perf_counter()
+    tmp = path + '.opt'
+    try:
+        if linearize:
+            # Linearized files cannot use object streams
+            lin_opts = {k: v for k, v in opts.items() if k != 'use_objstms'}
+            try:
+                doc.save(tmp, linear=True, **lin_opts)
+                report['linearized'] = True
+            except Exception:
+                # MuPDF 1.24+ dropped linearization support
+                doc.save(tmp, **opts)
+        else:
+            doc.save(tmp, **opts)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp): os.remove(tmp)
+    timed('optimize' if measure else 'save', t)
+    if measure: report['bytes_saved'] = plain - os.path.getsize(path)
+    return report
+
+def plan_layout(sources, settings):
+    """Work out sheet size, grid and page_map for a job without rendering anything."""
+    n_up = int(settings.get('n_up', 1))
+    page_map = []
+    with ExitStack() as checkouts:
+        docs = {}
+        for i, src in enumerate(sources):
+            if src['path'] not in docs:
+                docs[src['path']] = checkouts.enter_context(DOC_POOL.checkout(src['path']))
+            page_map += [(i, p) for p in select_pages(docs[src['path']], src.get('selected_pages', 'all'))]
+        if not page_map:
+            raise Exception("No pages selected in the queue.")
+        d, p = page_map[0]
+        first_rect = docs[sources[d]['path']][p].rect
+    layout = compute_layout(n_up, settings.get('orientation', 'auto'), first_rect)
+    return {'n_up': n_up, 'layout': layout, 'page_map': page_map, 'sheets': math.ceil(len(page_map) / n_up)}
+
+def render_preview(sources, plan, settings, sheet, dpi):
+    """Render one output sheet to a low-resolution PNG."""
+    # Always drawn in PDF space: the raster path looks the same at preview size
+    opts = {'n_up': plan['n_up'], 'border': settings.get('border', False),
+            'use_vector': True, 'vector_invert': bool(settings.get('invert'))}
+    with ExitStack() as checkouts:
+        docs = {}
+        input_docs = []
+        for src in sources:
+            if src['path'] not in docs:
+                docs[src['path']] = checkouts.enter_context(DOC_POOL.checkout(src['path']))
+            input_docs.append(docs[src['path']])
+        out_doc = fitz.open()
+        build_sheets(out_doc, input_docs, plan['page_map'], plan['layout'], opts, [sheet],
+                     lambda stage, start: None)
+        pix = out_doc[0].get_pixmap(dpi=dpi)
+        out_doc.close()
+    return pix.tobytes("png")
+
+# --- SHEET INDEX ---
+def sheet_key(cells, layout, render):
+    """Key for one output sheet: its (source sha256, page) cells, the grid and render settings."""
+    return DiskCache.make_key('sheet', cells, layout, render)
+
+class SheetIndex:
+    """Where each output sheet (by sheet_key) can be copied from, kept in a SQLite file."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sheets (
+            key TEXT PRIMARY KEY, path TEXT NOT NULL, page INTEGER NOT NULL,
+            mtime INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS sheets_path ON sheets (path);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def add(self, path, keys):
+        """Index the sheets of a finished output; keys[i] is the key of page i."""
+        mtime = os.stat(path).st_mtime_ns
+        with self._conn() as conn:
+            conn.executemany("INSERT OR REPLACE INTO sheets VALUES (?, ?, ?, ?)",
+                             [(key, path, page, mtime) for page, key in enumerate(keys)])
+
+    def find(self, keys):
+        """Map the keys that have a usable copy to (path, page)."""
+        keys = list(set(keys))
+        rows = []
+        conn = self._conn()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows += conn.execute(f"SELECT * FROM sheets WHERE key IN ({', '.join('?' * len(chunk))})",
+                                 chunk).fetchall()
+        found, stale, mtimes = {}, set(), {}
+        for row in rows:
+            path = row['path']
+            if path not in mtimes:
+                try:
+                    mtimes[path] = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    mtimes[path] = None
+            # The file was removed or rewritten since it was indexed
+            if mtimes[path] != row['mtime']: stale.add(path)
+            else: found[row['key']] = (path, row['page'])
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM sheets WHERE path = ?", [(p,) for p in stale])
+        return found
+
+# --- IMPOSITION ---
+def impose(sources, settings, output_path, progress=None, stats=None, sheet_index=None):
+    """Impose source PDFs onto output sheets and save to output_path.
+
+    sources are dicts with 'path', 'selected_pages' ('all' or page indices) and
+    optionally 'sha256'. progress, if given, is called as progress(stage, done,
+    total). stats, if given, is filled with per-stage seconds and page/byte counts.
+    sheet_index, a SheetIndex, lets unchanged sheets be copied from earlier
+    outputs; stats['sheet_keys'] then holds the keys to index this output under.
+    """
+    report = progress or (lambda stage, done, total: None)
+    stats = {} if stats is None else stats
+    stages = stats.setdefault('stages', {})
+
+    def timed(stage, start):
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - start
+
+    n_up = int(settings.get('n_up', 1))
+    invert = settings.get('invert', False)
+    border = settings.get('border', False)
+    low_dpi = settings.get('low_dpi', False)
+    dpi = 100 if low_dpi else 150
+    orient = settings.get('orientation', 'auto')
+    workers = int(settings.get('workers') or RENDER_WORKERS)
+    quality = int(settings.get('jpeg_quality', 85))
+    # Raster tiles: 'auto' picks bilevel / gray / colour encoding per page
+    color_mode = settings.get('color_mode', 'auto')
+    use_tile_cache = settings.get('tile_cache', True)
+    # Copy unchanged sheets from earlier outputs instead of rebuilding them
+    use_sheet_cache = sheet_index is not None and settings.get('sheet_cache', True)
+    # Split-and-merge for big vector jobs: 'auto', True or False
+    split = settings.get('split', 'auto')
+    split_chunk = int(settings.get('split_chunk') or SPLIT_CHUNK_SHEETS)
+    output_profile = settings.get('output_profile') or OUTPUT_PROFILE
+    linearize = settings.get('linearize', False)
+    # Also write the unoptimized file first to report bytes_saved (costs a second write)
+    measure_savings = settings.get('measure_savings', False)
+    
+    # Inversion is done in PDF space unless the raster fallback is requested
+    invert_mode = settings.get('invert_mode', 'vector')
+    use_vector = not (low_dpi or (invert and invert_mode == 'raster'))
+    vector_invert = use_vector and invert
+
+    input_docs = []
+    input_paths = []
+    page_map = [] 
+    raster_images = None
+    checkouts = ExitStack()
+    previous = {}
+
+    try:
+        # 1. Load Documents & Map Pages
+        report('loading', 0, len(sources))
+        t = time.perf_counter()
+        pooled = {}
+        for src in sources:
+            if src['path'] not in pooled:
+                pooled[src['path']] = checkouts.enter_context(DOC_POOL.checkout(src['path']))
+            doc = pooled[src['path']]
+            input_docs.append(doc)
+            input_paths.append(src['path'])
+            
+            for p in select_pages(doc, src.get('selected_pages', 'all')):
+                page_map.append((len(input_docs)-1, p))
+        timed('open', t)
+
+        if not page_map:
+            raise Exception("No pages selected in the queue.")
+
+        # 2. Setup Output Document
+        out_doc = fitz.open()
+        first_rect = input_docs[page_map[0][0]][page_map[0][1]].rect
+        layout = compute_layout(n_up, orient, first_rect)
+        num_sheets = math.ceil(len(page_map) / n_up)
+        opts = {'n_up': n_up, 'border': border, 'use_vector': use_vector, 'vector_invert': vector_invert}
+
+        # Sheets whose exact inputs were imposed before are copied, not rebuilt
+        sheet_keys, found = None, {}
+        hashes = None
+        if use_sheet_cache or (use_tile_cache and not use_vector):
+            hashes = [src.get('sha256') or sha256_file(src['path']) for src in sources]
+        if use_sheet_cache:
+            render = [border, use_vector, vector_invert] + ([] if use_vector else [invert, dpi, quality, color_mode])
+            sheet_keys = [sheet_key([(hashes[d], p) for d, p in page_map[s * n_up:(s + 1) * n_up]], layout, render)
+                          for s in range(num_sheets)]
+            found = sheet_index.find(sheet_keys)
+        todo = [s for s in range(num_sheets) if sheet_keys is None or sheet_keys[s] not in found]
+
+        if split == 'auto':
+            split = num_sheets >= SPLIT_MIN_SHEETS
+        split = bool(split) and use_vector and workers > 1 and num_sheets > split_chunk and not found
+
+        # 3. Render Pages
+        tile_formats = {}
+        if split:
+            t = time.perf_counter()
+            impose_split(out_doc, input_paths, page_map, layout, opts, num_sheets, split_chunk,
+                         workers, lambda done: report('rendering', done, num_sheets),
+                         os.path.dirname(os.path.abspath(output_path)))
+            timed('place', t)
+        else:
+            if not use_vector:
+                cells = [page_map[i] for s in todo for i in range(s * n_up, min((s + 1) * n_up, len(page_map)))]
+                jobs = [(input_paths[d], p, dpi, invert, quality, color_mode) for d, p in cells]
+                if use_tile_cache:
+                    keys = [DiskCache.make_key(hashes[d], p, dpi, invert, quality, color_mode) for d, p in cells]
+                    raster_images = cached_raster_pages(jobs, keys, workers, pooled)
+                else:
+                    raster_images = render_raster_pages(jobs, workers, pooled)
+
+            done = [0]
+            def on_sheet(idx):
+                done[0] += 1
+                report('rendering', done[0], num_sheets)
+
+            sheet = 0
+            while sheet < num_sheets:
+                # Runs of sheets to rebuild, or to copy from consecutive pages of one output
+                end = sheet + 1
+                hit = found.get(sheet_keys[sheet]) if sheet_keys else None
+                if hit is None:
+                    while end < num_sheets and (sheet_keys is None or sheet_keys[end] not in found): end += 1
+                    counts = build_sheets(out_doc, input_docs, page_map, layout, opts, range(sheet, end),
+                                          timed, raster_images, on_sheet)
+                    for fmt, n in counts.items(): tile_formats[fmt] = tile_formats.get(fmt, 0) + n
+                else:
+                    path, page = hit
+                    while end < num_sheets and found.get(sheet_keys[end]) == (path, page + end - sheet): end += 1
+                    t = time.perf_counter()
+                    if path not in previous: previous[path] = fitz.open(path)
+                    out_doc.insert_pdf(previous[path], from_page=page, to_page=page + end - sheet - 1)
+                    timed('reuse', t)
+                    done[0] += end - sheet
+                    report('rendering', done[0], num_sheets)
+                sheet = end
+
+        report('saving', num_sheets, num_sheets)
+        # Split parts and sheets copied from earlier outputs each bring their own
+        # copies of shared fonts/images; merge them on save
+        output = save_output(out_doc, output_path, output_profile, linearize,
+                             dedup=split or bool(found), timed=timed, measure=measure_savings)
+        out_doc.close()
+
+        # sheet_keys is for the caller to index the output once it is in place
+        stats.update(pages=len(page_map), sheets=num_sheets, split=split,
+                     sheets_reused=num_sheets - len(todo), sheet_keys=sheet_keys,
+                     vector_pages=len(page_map) if use_vector else 0,
+                     raster_pages=0 if use_vector else len(page_map),
+                     bytes_in=sum(os.path.getsize(p) for p in input_paths),
+                     bytes_out=os.path.getsize(output_path), tile_formats=tile_formats, output=output)
+        return stats
+    finally:
+        if raster_images is not None: raster_images.close()
+        for doc in previous.values(): doc.close()
+        checkouts.close()
@@ -0,0 +1,82 @@
+"""Build the web UI into ../static/dist for app.py.
+
+    pip install --require-hashes -r frontend/requirements.txt
+    python frontend/build.py
+
+Writes a minified JS bundle (vendored React UMD builds + src/app.jsx) and the
+Tailwind CSS, named by content hash, each with .gz and .br siblings, plus
+index.html with the asset tags filled in and manifest.json mapping app.js /
+app.css to the hashed names. The output is committed, so a checkout serves the
+UI without running this; rebuild after changing anything under frontend/.
+Everything runs offline from pinned Python packages; no npm or CDN.
+"""
+import os
+import sys
+import json
+import gzip
+import shutil
+import hashlib
+import subprocess
+
+import brotli
+import rjsmin
+from esbuild_py import transform
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+OUT = os.path.join(ROOT, '..', 'static', 'dist')
+
+# React 18.3.1 production UMD builds (MIT), checked against these hashes
+VENDOR = {
+    'react-18.3.1.min.js': 'd949f1c3687aedadcedac85261865f29b17cd273997e7f6b2bfc53b2f9d4c4dd',
+    'react-dom-18.3.1.min.js': '35f4f974f4b2bcd44da73963347f8952e341f83909e4498227d4e26b98f66f0d',
+}
+
+
+def read(*parts):
+    with open(os.path.join(ROOT, *parts), 'rb') as f: return f.read()
+
+def vendor_js():
+    chunks = []
+    for name, sha256 in VENDOR.items():
+        data = read('vendor', name)
+        if hashlib.sha256(data).hexdigest() != sha256:
+            sys.exit(f"frontend/vendor/{name} does not match its pinned hash")
+        chunks.append(data.decode())
+    return chunks
+
+def app_js():
+    # JSX -> React.createElement calls, wrapped so app.jsx's top-level names stay private
+    code = transform(read('src', 'app.jsx').decode())
+    return rjsmin.jsmin('(function(){\n' + code + '\n})();')
+
+def app_css():
+    # Tailwind v4 standalone CLI, from the tailwindcss-bin package
+    return subprocess.run(['tailwindcss', '-i', os.path.join(ROOT, 'src', 'app.css'), '--minify'],
+                          cwd=ROOT, check=True, capture_output=True).stdout
+
+def emit(name, data, hashed=True):
+    if hashed:
+        stem, ext = os.path.splitext(name)
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+    for suffix, body in (('', data), ('.gz', gzip.compress(data, 9, mtime=0)),
+                         ('.br', brotli.compress(data, quality=11))):
+        with open(os.path.join(OUT, name + suffix), 'wb') as f: f.write(body)
+    return name
+
+def main():
+    js = ';\n'.join(vendor_js() + [app_js()]).encode()
+    css = app_css()
+
+    shutil.rmtree(OUT, ignore_errors=True)
+    os.makedirs(OUT)
+    manifest = {'app.js': emit('app.js', js), 'app.css': emit('app.css', css)}
+    tags = (f'<link rel="stylesheet" href="/assets/{manifest["app.css"]}">\n'
+            f'    <script defer src="/assets/{manifest["app.js"]}"></script>')
+    emit('index.html', read('index.html').replace(b'<!-- ASSETS -->', tags.encode()), hashed=False)
+    with open(os.path.join(OUT, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+    print(json.dumps(manifest, indent=2))
+
+if __name__ == '__main__':
+    main()
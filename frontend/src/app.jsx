@@ -0,0 +1,267 @@
+// PyNUp web UI. React and ReactDOM are globals, from the UMD builds that
+// frontend/build.py puts ahead of this file in the bundle.
+const { useState, useEffect } = React;
+
+// Polling a job gives up after this long without any progress
+const JOB_STALL_MS = 5 * 60 * 1000;
+
+// ICONS
+const IconUpload = () => <svg xmlns="http://www.w3.org/2000/svg" width="24" height="24" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><path d="M21 15v4a2 2 0 0 1-2 2H5a2 2 0 0 1-2-2v-4"/><polyline points="17 8 12 3 7 8"/><line x1="12" y1="3" x2="12" y2="15"/></svg>;
+const IconGrid = () => <svg xmlns="http://www.w3.org/2000/svg" width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><rect x="3" y="3" width="7" height="7"/><rect x="14" y="3" width="7" height="7"/><rect x="14" y="14" width="7" height="7"/><rect x="3" y="14" width="7" height="7"/></svg>;
+const IconTrash = () => <svg xmlns="http://www.w3.org/2000/svg" width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><polyline points="3 6 5 6 21 6"/><path d="M19 6v14a2 2 0 0 1-2 2H7a2 2 0 0 1-2-2V6m3 0V4a2 2 0 0 1 2-2h4a2 2 0 0 1 2 2v2"/></svg>;
+const IconCheck = () => <svg xmlns="http://www.w3.org/2000/svg" width="16" height="16" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="3"><polyline points="20 6 9 17 4 12"/></svg>;
+const IconX = () => <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><line x1="18" y1="6" x2="6" y2="18"/><line x1="6" y1="6" x2="18" y2="18"/></svg>;
+const IconSun = () => <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><circle cx="12" cy="12" r="5"/><line x1="12" y1="1" x2="12" y2="3"/><line x1="12" y1="21" x2="12" y2="23"/><line x1="4.22" y1="4.22" x2="5.64" y2="5.64"/><line x1="18.36" y1="18.36" x2="19.78" y2="19.78"/><line x1="1" y1="12" x2="3" y2="12"/><line x1="21" y1="12" x2="23" y2="12"/><line x1="4.22" y1="19.78" x2="5.64" y2="18.36"/><line x1="18.36" y1="5.64" x2="19.78" y2="4.22"/></svg>;
+const IconMoon = () => <svg xmlns="http://www.w3.org/2000/svg" width="20" height="20" viewBox="0 0 24 24" fill="none" stroke="currentColor" strokeWidth="2"><path d="M21 12.79A9 9 0 1 1 11.21 3 7 7 0 0 0 21 12.79z"/></svg>;
+
+function PageSelectorModal({ isOpen, file, onClose, onSave }) {
+    const [selected, setSelected] = useState(new Set());
+
+    useEffect(() => {
+        if (isOpen && file) {
+            if (file.selectedPages === 'all') {
+                setSelected(new Set(Array.from({length: file.pages}, (_, i) => i)));
+            } else {
+                setSelected(new Set(file.selectedPages));
+            }
+        }
+    }, [isOpen, file]);
+
+    if (!isOpen) return null;
+
+    const togglePage = (idx) => {
+        const next = new Set(selected);
+        if (next.has(idx)) next.delete(idx); else next.add(idx);
+        setSelected(next);
+    };
+
+    const handleSave = () => {
+        if (selected.size === file.pages) onSave('all');
+        else onSave(Array.from(selected).sort((a,b) => a-b));
+        onClose();
+    };
+
+    return (
+        <div className="fixed inset-0 z-50 flex items-center justify-center bg-black/80 backdrop-blur-sm p-4">
+            <div className="bg-white dark:bg-slate-900 w-full max-w-5xl h-[85vh] rounded-2xl border border-gray-200 dark:border-slate-700 flex flex-col shadow-2xl overflow-hidden">
+                <div className="p-4 border-b border-gray-200 dark:border-slate-700 flex justify-between items-center bg-gray-50 dark:bg-slate-800/50">
+                    <div><h3 className="text-lg font-bold text-gray-800 dark:text-white flex items-center gap-2"><IconGrid /> Select Pages: {file.name}</h3><p className="text-sm text-gray-500 dark:text-slate-400">{selected.size} / {file.pages} pages selected</p></div>
+                    <button onClick={onClose} className="text-gray-500 hover:text-gray-900 dark:text-slate-400 dark:hover:text-white"><IconX /></button>
+                </div>
+                <div className="p-3 bg-gray-50 dark:bg-slate-950 border-b border-gray-200 dark:border-slate-800 flex gap-2">
+                    <button onClick={() => setSelected(new Set(Array.from({length: file.pages}, (_, i) => i)))} className="px-3 py-1 text-xs font-medium bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 hover:bg-gray-100 dark:hover:bg-slate-700 text-gray-700 dark:text-white rounded">Select All</button>
+                    <button onClick={() => setSelected(new Set())} className="px-3 py-1 text-xs font-medium bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 hover:bg-gray-100 dark:hover:bg-slate-700 text-gray-700 dark:text-white rounded">Deselect All</button>
+                    <button onClick={() => { const next = new Set(); for(let i=0; i<file.pages; i++) if(!selected.has(i)) next.add(i); setSelected(next); }} className="px-3 py-1 text-xs font-medium bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 hover:bg-gray-100 dark:hover:bg-slate-700 text-gray-700 dark:text-white rounded">Invert</button>
+                </div>
+                <div className="flex-1 overflow-y-auto p-6 bg-gray-100 dark:bg-slate-950">
+                    <div className="grid grid-cols-2 sm:grid-cols-3 md:grid-cols-4 lg:grid-cols-6 gap-4">
+                        {Array.from({length: file.pages}, (_, idx) => {
+                            const isSel = selected.has(idx);
+                            return (
+                                <div key={idx} onClick={() => togglePage(idx)} className={`relative cursor-pointer group rounded-lg overflow-hidden border-2 transition-all ${isSel ? 'border-blue-500 shadow-lg shadow-blue-500/20' : 'border-gray-200 dark:border-slate-800 opacity-60 hover:opacity-100 hover:border-gray-400 dark:hover:border-slate-600'}`}>
+                                    <div className="aspect-[1/1.4] bg-white dark:bg-slate-900"><img src={`/thumbnails/${file.id}/${idx}.png`} loading="lazy" className="w-full h-full object-contain" /></div>
+                                    <div className={`absolute top-2 right-2 w-6 h-6 rounded-full flex items-center justify-center text-white text-xs font-bold transition ${isSel ? 'bg-blue-500' : 'bg-black/50'}`}>{isSel ? <IconCheck /> : idx+1}</div>
+                                </div>
+                            )
+                        })}
+                    </div>
+                </div>
+                <div className="p-4 border-t border-gray-200 dark:border-slate-800 bg-white dark:bg-slate-900 flex justify-end gap-3">
+                    <button onClick={onClose} className="px-4 py-2 text-sm font-medium text-gray-600 dark:text-slate-400 hover:text-gray-900 dark:hover:text-white">Cancel</button>
+                    <button onClick={handleSave} className="px-6 py-2 text-sm font-bold bg-blue-600 hover:bg-blue-500 text-white rounded-lg shadow-lg">Save Selection</button>
+                </div>
+            </div>
+        </div>
+    );
+}
+
+// Small files go up in one streamed request; big ones in resumable chunks
+const RESUMABLE_THRESHOLD = 32 * 1024 * 1024;
+async function uploadFile(file) {
+    const name = encodeURIComponent(file.name);
+    if (file.size <= RESUMABLE_THRESHOLD) {
+        const res = await fetch(`/upload?name=${name}`, { method: 'POST', headers: { 'Content-Type': 'application/pdf' }, body: file });
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.error);
+        return data;
+    }
+    const session = await (await fetch('/uploads', { method: 'POST' })).json();
+    let offset = 0, retries = 0;
+    while (offset < file.size) {
+        const end = Math.min(offset + session.chunk_size, file.size);
+        try {
+            const res = await fetch(`/uploads/${session.upload_id}`, { method: 'PUT', headers: { 'Content-Range': `bytes ${offset}-${end - 1}/${file.size}` }, body: file.slice(offset, end) });
+            const data = await res.json();
+            if (res.ok || res.status === 409) { offset = data.offset; retries = 0; continue; }
+            throw new Error(data.error);
+        } catch (err) {
+            if (++retries > 5) throw err;
+            await new Promise(r => setTimeout(r, 1000 * retries));
+            offset = (await (await fetch(`/uploads/${session.upload_id}`)).json()).offset;
+        }
+    }
+    const res = await fetch(`/uploads/${session.upload_id}/complete?name=${name}`, { method: 'POST' });
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.error);
+    return data;
+}
+
+function App() {
+    const [files, setFiles] = useState([]); 
+    const [settings, setSettings] = useState({ n_up: "1", orientation: "auto", invert: false, invert_mode: "vector", low_dpi: false, border: false, output_profile: "balanced" });
+    const [isProcessing, setIsProcessing] = useState(false);
+    const [jobProgress, setJobProgress] = useState(null);
+    const [modal, setModal] = useState({ open: false, fileId: null });
+    const [theme, setTheme] = useState('dark');
+    const [preview, setPreview] = useState(null);
+    const [previewSheet, setPreviewSheet] = useState(0);
+
+    useEffect(() => {
+        if (theme === 'dark') document.documentElement.classList.add('dark');
+        else document.documentElement.classList.remove('dark');
+    }, [theme]);
+
+    // Layout preview: debounced, and only the visible sheet is ever rendered
+    const previewKey = JSON.stringify([files.filter(f => f.status === 'done').map(f => [f.id, f.selectedPages]), settings.n_up, settings.orientation, settings.invert, settings.border]);
+    useEffect(() => { setPreviewSheet(0); }, [previewKey]);
+    useEffect(() => {
+        const ready = files.filter(f => f.status === 'done');
+        if (ready.length === 0) { setPreview(null); return; }
+        const timer = setTimeout(async () => {
+            try {
+                const payload = { files: ready.map(f => ({ id: f.id, selected_pages: f.selectedPages })), settings, start: previewSheet, count: 1 };
+                const res = await fetch('/preview', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
+                setPreview(res.ok ? await res.json() : null);
+            } catch (err) { setPreview(null); }
+        }, 250);
+        return () => clearTimeout(timer);
+    }, [previewKey, previewSheet]);
+
+    const toggleTheme = () => setTheme(prev => prev === 'dark' ? 'light' : 'dark');
+
+    const handleFiles = async (fileList) => {
+        const newUploads = Array.from(fileList).map(f => ({ tempId: Math.random(), fileObj: f, name: f.name, pages: 0, status: 'uploading', selectedPages: 'all' }));
+        setFiles(prev => [...prev, ...newUploads]);
+        for (let item of newUploads) {
+            try {
+                const data = await uploadFile(item.fileObj);
+                setFiles(prev => prev.map(f => f.tempId === item.tempId ? { ...f, id: data.id, pages: data.pages, status: 'done' } : f));
+            } catch (err) {
+                alert(`Failed to upload ${item.name}`);
+                setFiles(prev => prev.filter(f => f.tempId !== item.tempId));
+            }
+        }
+    };
+
+    const openSelector = (id) => { const f = files.find(f => f.id === id); if (f && f.status === 'done') setModal({ open: true, fileId: id }); };
+    const saveSelection = (fileId, newSelection) => { setFiles(prev => prev.map(f => f.id === fileId ? { ...f, selectedPages: newSelection } : f)); };
+
+    const handleSubmit = async () => {
+        if (files.some(f => f.status === 'uploading')) return alert("Please wait for uploads to finish");
+        if (files.length === 0) return alert("Queue is empty");
+        setIsProcessing(true);
+        try {
+            const payload = { files: files.map(f => ({ id: f.id, selected_pages: f.selectedPages })), settings };
+            const res = await fetch('/jobs', { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify(payload) });
+            const created = await res.json();
+            if (!res.ok) throw new Error(created.error || "Processing failed");
+
+            // Give up once the job stops moving; the server also fails jobs whose worker died
+            let job = created, seen = '', changed = Date.now();
+            while (job.status === 'queued' || job.status === 'running') {
+                await new Promise(r => setTimeout(r, 1000));
+                const poll = await fetch(`/jobs/${created.job_id}`);
+                job = await poll.json();
+                if (!poll.ok) throw new Error(job.error || "Lost track of the job");
+                const state = `${job.status}/${job.stage}/${job.done}`;
+                if (state !== seen) { seen = state; changed = Date.now(); }
+                else if (Date.now() - changed > JOB_STALL_MS) throw new Error("Processing stalled, please try again");
+                setJobProgress(job);
+            }
+            if (job.status !== 'done') throw new Error(job.error || "Processing failed");
+
+            const firstFile = files[0].name.replace('.pdf', '');
+            const nUpSuffix = settings.n_up > 1 ? `_${settings.n_up}up` : '';
+            const effectSuffix = settings.invert ? '_inverted' : '';
+            const countSuffix = files.length > 1 ? '_merged' : '';
+            const name = `${firstFile}${countSuffix}${nUpSuffix}${effectSuffix}.pdf`;
+
+            const a = document.createElement('a');
+            a.href = `/jobs/${created.job_id}/download?name=${encodeURIComponent(name)}`;
+            a.download = name;
+            document.body.appendChild(a); a.click(); document.body.removeChild(a);
+        } catch (err) { alert(err.message); } finally { setIsProcessing(false); setJobProgress(null); }
+    };
+
+    const activeFile = modal.fileId ? files.find(f => f.id === modal.fileId) : null;
+
+    return (
+        <div className="min-h-screen p-6 md:p-12 max-w-6xl mx-auto transition-colors duration-300">
+            {activeFile && <PageSelectorModal isOpen={modal.open} file={activeFile} onClose={() => setModal({ open: false, fileId: null })} onSave={(sel) => saveSelection(modal.fileId, sel)} />}
+
+            <header className="mb-10 flex items-center justify-between">
+                <div>
+                    <h1 className="text-4xl font-extrabold bg-gradient-to-r from-blue-500 to-indigo-500 bg-clip-text text-transparent mb-2">PyNUp Web</h1>
+                    <p className="text-gray-500 dark:text-slate-400">Visual PDF Layout Tool</p>
+                </div>
+                <button onClick={toggleTheme} className="p-3 rounded-full bg-white dark:bg-slate-800 border border-gray-200 dark:border-slate-700 text-gray-500 dark:text-slate-400 hover:text-blue-500 dark:hover:text-blue-400 transition shadow-sm">
+                    {theme === 'dark' ? <IconSun /> : <IconMoon />}
+                </button>
+            </header>
+
+            <div className="grid grid-cols-1 lg:grid-cols-3 gap-8">
+                <div className="lg:col-span-2 space-y-6">
+                    <div className="border-2 border-dashed border-gray-300 dark:border-slate-700 bg-white dark:bg-slate-800/30 rounded-xl p-8 text-center hover:bg-gray-50 dark:hover:bg-slate-800/50 transition relative">
+                        <input type="file" multiple accept="application/pdf" className="absolute inset-0 opacity-0 cursor-pointer" onChange={(e) => handleFiles(e.target.files)} />
+                        <div className="flex flex-col items-center gap-4"><div className="w-16 h-16 bg-blue-500/10 rounded-full flex items-center justify-center text-blue-500 dark:text-blue-400"><IconUpload /></div><div><p className="text-lg font-medium text-gray-700 dark:text-slate-200">Drag & Drop or Click to Upload</p></div></div>
+                    </div>
+                    <div className="bg-white dark:bg-slate-900 rounded-xl border border-gray-200 dark:border-slate-800 overflow-hidden min-h-[300px] shadow-sm">
+                        {files.length === 0 ? <div className="p-8 text-center text-gray-400 dark:text-slate-500 italic mt-10">Drop PDFs here to begin</div> : 
+                            <div className="divide-y divide-gray-100 dark:divide-slate-800">{files.map((file, idx) => (
+                                <div key={file.tempId || file.id} className="p-4 flex items-center gap-4 hover:bg-gray-50 dark:hover:bg-slate-800/50 transition group">
+                                    <div className="w-8 text-center text-gray-400 dark:text-slate-600 font-mono text-xs">{idx+1}</div>
+                                    <div className="flex-1 min-w-0">
+                                        <div className="flex items-center gap-2"><p className="font-medium text-gray-800 dark:text-slate-200 truncate">{file.name}</p>{file.status === 'uploading' && <span className="text-xs text-blue-500 dark:text-blue-400 animate-pulse">Uploading...</span>}</div>
+                                        {file.status === 'done' && <p className="text-xs text-gray-500 dark:text-slate-500">{file.selectedPages === 'all' ? `All ${file.pages} pages included` : `${file.selectedPages.length} of ${file.pages} pages selected`}</p>}
+                                    </div>
+                                    {file.status === 'done' && <button onClick={() => openSelector(file.id)} className="px-3 py-1.5 text-xs font-bold bg-gray-100 dark:bg-slate-800 hover:bg-blue-600 text-blue-600 dark:text-blue-400 hover:text-white rounded border border-gray-200 dark:border-slate-700 transition flex items-center gap-2"><IconGrid /> Select Pages</button>}
+                                    <button onClick={() => setFiles(f => f.filter((_, i) => i !== idx))} className="p-2 text-gray-400 dark:text-slate-500 hover:text-red-500 dark:hover:text-red-400 opacity-0 group-hover:opacity-100 transition"><IconTrash /></button>
+                                </div>
+                            ))}</div>
+                        }
+                    </div>
+                </div>
+
+                <div className="bg-white dark:bg-slate-900 rounded-xl border border-gray-200 dark:border-slate-800 p-6 h-fit space-y-8 shadow-sm">
+                    <div>
+                        <h2 className="text-xl font-bold text-gray-900 dark:text-white mb-4">Settings</h2>
+                        <div className="space-y-6">
+                            <div><label className="text-xs font-bold text-gray-500 dark:text-slate-500 uppercase tracking-wider mb-2 block">Layout</label><div className="grid grid-cols-4 gap-2">{['1', '2', '4', '6'].map(n => (<button key={n} onClick={() => setSettings({...settings, n_up: n})} className={`py-2 rounded font-bold text-sm transition ${settings.n_up == n ? 'bg-blue-600 text-white shadow-lg shadow-blue-500/25' : 'bg-gray-100 dark:bg-slate-950 text-gray-500 dark:text-slate-400 hover:bg-gray-200 dark:hover:bg-slate-800'}`}>{n}-Up</button>))}</div></div>
+                            <div><label className="text-xs font-bold text-gray-500 dark:text-slate-500 uppercase tracking-wider mb-2 block">Orientation</label><select value={settings.orientation} onChange={(e) => setSettings({...settings, orientation: e.target.value})} className="w-full bg-gray-50 dark:bg-slate-950 border border-gray-200 dark:border-slate-700 rounded p-2.5 text-gray-800 dark:text-slate-200 text-sm outline-none focus:border-blue-500"><option value="auto">Auto (Detect)</option><option value="portrait">Portrait</option><option value="landscape">Landscape</option></select></div>
+                            <div><label className="text-xs font-bold text-gray-500 dark:text-slate-500 uppercase tracking-wider mb-2 block">Output</label><select value={settings.output_profile} onChange={(e) => setSettings({...settings, output_profile: e.target.value})} className="w-full bg-gray-50 dark:bg-slate-950 border border-gray-200 dark:border-slate-700 rounded p-2.5 text-gray-800 dark:text-slate-200 text-sm outline-none focus:border-blue-500"><option value="fast">Fast (No Optimization)</option><option value="balanced">Balanced</option><option value="smallest">Smallest File</option></select></div>
+                            <div className="space-y-3">
+                                <label className="flex items-center gap-3 cursor-pointer group select-none"><div className={`w-5 h-5 rounded border flex items-center justify-center transition ${settings.invert ? 'bg-purple-600 border-purple-500' : 'border-gray-300 dark:border-slate-600 bg-gray-50 dark:bg-slate-950'}`}>{settings.invert && <IconCheck className="text-white"/>}</div><input type="checkbox" className="hidden" checked={settings.invert} onChange={() => setSettings({...settings, invert: !settings.invert})} /><span className="text-sm text-gray-600 dark:text-slate-300">Invert Colors</span></label>
+                                {settings.invert && <label className="flex items-center gap-3 cursor-pointer group select-none pl-8"><div className={`w-5 h-5 rounded border flex items-center justify-center transition ${settings.invert_mode === 'raster' ? 'bg-purple-600 border-purple-500' : 'border-gray-300 dark:border-slate-600 bg-gray-50 dark:bg-slate-950'}`}>{settings.invert_mode === 'raster' && <IconCheck className="text-white"/>}</div><input type="checkbox" className="hidden" checked={settings.invert_mode === 'raster'} onChange={() => setSettings({...settings, invert_mode: settings.invert_mode === 'raster' ? 'vector' : 'raster'})} /><span className="text-sm text-gray-600 dark:text-slate-300">Rasterize Inverted Pages</span></label>}
+                                <label className="flex items-center gap-3 cursor-pointer group select-none"><div className={`w-5 h-5 rounded border flex items-center justify-center transition ${settings.low_dpi ? 'bg-amber-600 border-amber-500' : 'border-gray-300 dark:border-slate-600 bg-gray-50 dark:bg-slate-950'}`}>{settings.low_dpi && <IconCheck className="text-white"/>}</div><input type="checkbox" className="hidden" checked={settings.low_dpi} onChange={() => setSettings({...settings, low_dpi: !settings.low_dpi})} /><span className="text-sm text-gray-600 dark:text-slate-300">Low DPI (Save RAM)</span></label>
+                                <label className="flex items-center gap-3 cursor-pointer group select-none"><div className={`w-5 h-5 rounded border flex items-center justify-center transition ${settings.border ? 'bg-emerald-600 border-emerald-500' : 'border-gray-300 dark:border-slate-600 bg-gray-50 dark:bg-slate-950'}`}>{settings.border && <IconCheck className="text-white"/>}</div><input type="checkbox" className="hidden" checked={settings.border} onChange={() => setSettings({...settings, border: !settings.border})} /><span className="text-sm text-gray-600 dark:text-slate-300">Add Borders</span></label>
+                            </div>
+                        </div>
+                    </div>
+                    {preview && preview.sheets.length > 0 && <div>
+                        <label className="text-xs font-bold text-gray-500 dark:text-slate-500 uppercase tracking-wider mb-2 block">Preview</label>
+                        <img src={preview.sheets[0].url} alt={`Sheet ${previewSheet + 1}`} className="w-full border border-gray-200 dark:border-slate-700 rounded bg-white" style={{ aspectRatio: `${preview.page_size[0]} / ${preview.page_size[1]}` }} />
+                        <div className="flex items-center justify-between mt-2 text-xs text-gray-500 dark:text-slate-400">
+                            <button onClick={() => setPreviewSheet(s => Math.max(0, s - 1))} disabled={previewSheet === 0} className="px-2 py-1 rounded hover:bg-gray-100 dark:hover:bg-slate-800 disabled:opacity-30">&larr;</button>
+                            <span>Sheet {previewSheet + 1} / {preview.total_sheets} &middot; {preview.grid[0]}&times;{preview.grid[1]}</span>
+                            <button onClick={() => setPreviewSheet(s => Math.min(preview.total_sheets - 1, s + 1))} disabled={previewSheet >= preview.total_sheets - 1} className="px-2 py-1 rounded hover:bg-gray-100 dark:hover:bg-slate-800 disabled:opacity-30">&rarr;</button>
+                        </div>
+                    </div>}
+                    <button onClick={handleSubmit} disabled={isProcessing} className="w-full py-4 bg-gradient-to-r from-blue-600 to-indigo-600 hover:from-blue-500 hover:to-indigo-500 text-white font-bold rounded-xl shadow-lg shadow-blue-500/25 transition disabled:opacity-50 disabled:cursor-not-allowed">{isProcessing ? (jobProgress && jobProgress.stage === 'rendering' ? `Processing... ${jobProgress.done} / ${jobProgress.total} sheets` : 'Processing...') : 'Merge & Download PDF'}</button>
+                </div>
+            </div>
+        </div>
+    );
+}
+
+const root = ReactDOM.createRoot(document.getElementById('root'));
+root.render(<App />);
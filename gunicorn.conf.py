@@ -0,0 +1,16 @@
+"""Gunicorn settings for PyNUp: gunicorn app:app (this file is picked up from the cwd).
+
+Importing app has no background side effects; each worker starts its own
+storage sweeper here once the app is loaded.
+"""
+import os
+
+bind = os.environ.get('PYNUP_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('PYNUP_WEB_WORKERS', 2))
+# Async /jobs keep requests short, but sync /process may run for minutes
+timeout = int(os.environ.get('PYNUP_WEB_TIMEOUT', 300))
+
+
+def post_worker_init(worker):
+    from app import start_background
+    start_background()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bench  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def corpus(tmp_path_factory):
+    """corpus(kind, pages) -> path of a generated benchmark PDF, shared by all tests."""
+    root = tmp_path_factory.mktemp('corpus')
+    return lambda kind, pages: bench.corpus_path(str(root), kind, pages)
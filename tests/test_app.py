@@ -0,0 +1,77 @@
+import os
+import sys
+import subprocess
+
+from conftest import ROOT
+
+
+def run_app(code, data_dir):
+    """Run code in a fresh process that has imported app with its own DATA_DIR."""
+    env = {**os.environ, 'PYNUP_DATA_DIR': str(data_dir)}
+    result = subprocess.run([sys.executable, '-c', 'from app import *\n' + code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_metrics_add_up_server_processes(tmp_path):
+    # Two workers count and exit; a third answers the scrape with their totals
+    for _ in range(2):
+        run_app("PAGES_TOTAL.inc(3, path='vector'); JOB_SECONDS.observe(0.2, mode='job');"
+                "THUMB_CACHE.count_miss(); publish_metrics()", tmp_path)
+    scrape = "print(app.test_client().get('/metrics').get_data(as_text=True))"
+    text = run_app(scrape, tmp_path)
+    assert 'pynup_pages_total{path="vector"} 6' in text
+    assert 'pynup_job_seconds_count{mode="job"} 2' in text
+    assert 'pynup_cache_misses_total{cache="thumbnails"} 2' in text
+
+    # Folding the exited workers' rows keeps the totals
+    run_app("FILES.sweep(FILE_TTL, STORAGE_QUOTA, JOB_RETENTION, JOB_STALE_AFTER)", tmp_path)
+    text = run_app(scrape, tmp_path)
+    assert 'pynup_pages_total{path="vector"} 6' in text
+    assert 'pynup_job_seconds_count{mode="job"} 2' in text
+
+
+def test_quiet_jobs_fail_only_when_their_owner_exited(tmp_path):
+    exited = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True).stdout.strip()
+    text = run_app(f"""
+old = time.time() - 2 * JOB_STALE_AFTER
+for job_id, owner in (('busy', os.getpid()), ('gone', {exited})):
+    FILES.create_job({{'id': job_id, 'status': 'running', 'stage': 'impose', 'done': 0, 'total': 0,
+                      'created': old, 'output_path': job_id, 'owner': owner, 'heartbeat': old}}, 8, JOB_STALE_AFTER)
+FILES.fail_stale_jobs(JOB_STALE_AFTER)
+print(FILES.get_job('busy')['status'], FILES.get_job('gone')['status'])
+# The owner of a failed job finishing late leaves the failure in place
+print(FILES.update_own_job('gone', {exited}, 'running', status='done'), FILES.get_job('gone')['status'])
+""", tmp_path)
+    assert text.split()[-4:] == ['running', 'error', 'False', 'error']
+
+
+
+def test_file_lookups_refresh_last_use_coarsely(tmp_path):
+    # A recent last use is left alone; an older one is brought up to date
+    text = run_app("""
+path = os.path.join(DATA_DIR, 'pynup_a.pdf')
+open(path, 'wb').close()
+FILES.add('a', path, 0, 1, 'x')
+for age in (10, 2 * ACCESS_RESOLUTION):
+    with FILES._conn() as conn: conn.execute("UPDATE files SET accessed = ?", (time.time() - age,))
+    FILES.get('a')
+    print(round(time.time() - FILES.get('a')['accessed']))
+""", tmp_path)
+    assert text.split()[-2:] == ['10', '0']
+
+
+def test_previews_survive_image_eviction(corpus, tmp_path):
+    text = run_app(f"""
+import shutil
+FILES.add('a', {corpus('text', 10)!r}, 0, 10, 'x')
+client = app.test_client()
+key = client.post('/preview', json={{'files': [{{'id': 'a'}}], 'settings': {{'n_up': 2}}}}).json['key']
+print(client.get(f'/preview/{{key}}/0.png').status_code, PREVIEW_CACHE.stats()['hits'])
+shutil.rmtree(PREVIEW_CACHE.dir)
+print(client.get(f'/preview/{{key}}/0.png').status_code, PREVIEW_CACHE.stats()['hits'])
+print(client.get(f'/preview/{{key}}/0.png').status_code, PREVIEW_CACHE.stats()['hits'])
+""", tmp_path)
+    assert text.split()[-6:] == ['200', '0', '200', '0', '200', '1']
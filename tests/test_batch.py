@@ -0,0 +1,39 @@
+import os
+import shutil
+import sys
+import subprocess
+
+from conftest import ROOT
+
+
+def run_batch(args, data_dir, workers, timeout=60):
+    env = {**os.environ, 'PYNUP_DATA_DIR': str(data_dir), 'PYNUP_RENDER_WORKERS': str(workers)}
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'batch.py'), *args], env=env,
+                          capture_output=True, text=True, timeout=timeout)
+
+
+def test_raster_jobs_exit_with_render_pool(corpus, tmp_path):
+    # Cold tile cache, so pages really go through the shared worker pool
+    inputs = [corpus('text', 10), corpus('image', 12)]
+    out = tmp_path / 'out'
+    result = run_batch([*inputs, '-o', str(out), '--n-up', '2', '--low-dpi', '-j', '2'], tmp_path / 'data', 2)
+    assert result.returncode == 0, result.stderr
+    assert sorted(os.listdir(out)) == ['image_12_2up.pdf', 'text_10_2up.pdf']
+
+    # A single job gets every render worker
+    result = run_batch([inputs[1], '-o', str(out), '--n-up', '4', '--low-dpi', '-j', '1'], tmp_path / 'data2', 4)
+    assert result.returncode == 0, result.stderr
+    assert 'image_12_4up.pdf' in os.listdir(out)
+
+
+def test_jobs_sharing_an_output_fail(corpus, tmp_path):
+    for folder in ('g1', 'g2'):
+        os.makedirs(tmp_path / folder)
+        shutil.copy(corpus('text', 10), tmp_path / folder / 'x.pdf')
+    out = tmp_path / 'out'
+    result = run_batch([str(tmp_path / 'g*' / 'x.pdf'), '-o', str(out), '--n-up', '2', '--jsonl'],
+                       tmp_path / 'data', 1)
+    assert result.returncode == 1
+    errors = [line for line in result.stdout.splitlines() if '"error"' in line]
+    assert len(errors) == 2 and 'also written by' in errors[0]
+    assert not os.path.exists(out / 'x_2up.pdf')
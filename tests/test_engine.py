@@ -0,0 +1,54 @@
+import os
+
+import fitz  # PyMuPDF
+
+import engine
+
+
+def image_count(path):
+    with fitz.open(path) as doc:
+        return sum(1 for xref in range(1, doc.xref_length())
+                   if doc.xref_get_key(xref, 'Subtype') == ('name', '/Image'))
+
+
+def test_split_output_shares_images(corpus, tmp_path):
+    # Every part grafts its own copy of the images; saving must merge them again
+    sources = [{'path': corpus('image', 20), 'selected_pages': 'all'}] * 3
+    outputs = {}
+    for split in (False, True):
+        path = str(tmp_path / f"split_{split}.pdf")
+        stats = engine.impose(sources, {'n_up': 2, 'split': split, 'split_chunk': 3, 'workers': 2}, path)
+        assert stats['split'] == split
+        outputs[split] = path
+    engine.shutdown_pool()
+
+    assert image_count(outputs[True]) == image_count(outputs[False])
+    assert os.path.getsize(outputs[True]) <= 1.1 * os.path.getsize(outputs[False])
+
+
+def test_reused_sheets_share_images(corpus, tmp_path):
+    # Sheets copied from earlier outputs bring their own images along
+    src = corpus('image', 20)
+    index = engine.SheetIndex(str(tmp_path / 'sheets.db'))
+    for n in range(4):
+        pages = [p for p in range(20) if p != 2 * n + 1]
+        sources = [{'path': src, 'selected_pages': pages}]
+        reused = str(tmp_path / f"reused_{n}.pdf")
+        stats = engine.impose(sources, {'n_up': 2}, reused, sheet_index=index)
+        index.add(reused, stats['sheet_keys'])
+        fresh = str(tmp_path / f"fresh_{n}.pdf")
+        engine.impose(sources, {'n_up': 2}, fresh)
+
+        if n: assert stats['sheets_reused'] > 0
+        assert image_count(reused) == image_count(fresh)
+        assert os.path.getsize(reused) <= 1.1 * os.path.getsize(fresh)
+
+
+def test_pool_workers_report_peak_rss(corpus, tmp_path):
+    # Pool workers are children of the fork server, invisible to RUSAGE_CHILDREN here
+    settings = {'invert': True, 'invert_mode': 'raster', 'tile_cache': False, 'workers': 2}
+    stats = engine.impose([{'path': corpus('image', 12), 'selected_pages': 'all'}], settings,
+                          str(tmp_path / 'raster.pdf'))
+    engine.shutdown_pool()
+    assert stats['raster_pages'] == 12
+    assert engine.worker_maxrss() > 0